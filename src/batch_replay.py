@@ -0,0 +1,424 @@
+"""
+批量录屏回放工具。
+把一批录屏文件分发到多个进程中，每个文件用与 debug_replay 相同的帧来源和 run() 回放，
+汇总每局的计牌结果、游戏结束自检的警告和回放速度，输出为 JSON 和/或 CSV 报告。
+常用于修改 config.yaml 后在大量录屏上检查识别效果。
+
+用法：
+    python batch_replay.py recordings/
+    python batch_replay.py "recordings/*.mp4" other.mp4 --jobs 4 --json report.json --csv report.csv
+    python batch_replay.py recordings/ --sample-interval 0.5
+    python batch_replay.py long_session.mp4 --split
+
+--split 先稀疏扫描每个录屏找出各局的起止帧，再把每一局作为独立任务分给进程池，
+单个长录屏的回放耗时也能随核数缩短。
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from threading import Event
+from time import perf_counter
+from typing import Any, Iterator, Optional
+
+import cv2
+from loguru import logger
+
+import tracker
+from calibrate import calibrate_scale
+from capture import region_to_pixels
+from card_types import Mark, Player
+from config import THRESHOLDS
+from debug_replay import skip_popups, video_frames
+from frame_store import decode_frames
+from recognize import WarningDetector, identify_cards, match_mark
+from tracker import CARDS, LANDLORD_REGIONS, Counter, run
+
+# 传入目录时收集其中这些扩展名的文件
+_VIDEO_SUFFIXES = {".mp4", ".mkv", ".avi", ".mov", ".flv", ".webm"}
+# --split 时找对局边界的稀疏扫描默认每隔多少秒取一帧
+_SCAN_INTERVAL = 1.0
+
+
+# ---------------------------------------------------------------------------
+# 单个文件的回放（在工作进程中执行）
+# ---------------------------------------------------------------------------
+
+
+def _init_worker(log_level: str, single_thread: bool) -> None:
+    """工作进程初始化：只保留较高级别的日志；多进程并行时让 OpenCV 单线程，避免线程数超过核数。"""
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    if single_thread:
+        cv2.setNumThreads(1)
+
+
+def _counts(row) -> dict[str, int]:
+    return {card.value: int(n) for card, n in zip(CARDS, row)}
+
+
+def replay_file(
+    path: str, sample_interval: float = 0.0, start_frame: int = 0, end_frame: int = 0
+) -> dict[str, Any]:
+    """回放一个录屏文件（或其中 [start_frame, end_frame) 这一段），返回统计结果。
+    任何异常都记录在结果里，不向外抛出。
+    """
+    games: list[dict[str, Any]] = []
+    warnings: list[tuple[str, str]] = []  # (函数名, 警告内容)，每局结束时归入该局
+    plays: list[dict[str, Any]] = []
+    game_end: dict[str, Any] = {}
+    frames_read = 0
+
+    counter = Counter()
+
+    def on_update(player: Player, cards: tracker.CardCounts) -> None:
+        plays.append({"player": player.name, "cards": {c.value: n for c, n in cards.items()}})
+
+    def close_game() -> None:
+        """把当前计数和这一局期间收集到的信息记为一局。"""
+        if not plays and not game_end:
+            warnings.clear()
+            return
+        games.append(
+            {
+                "game": len(games) + 1,
+                "finished": bool(game_end),
+                "landlord": game_end.get("landlord"),
+                "last_player": game_end.get("last_player"),
+                "plays": list(plays),
+                "remaining": _counts(counter.remaining),
+                "left": _counts(counter.left),
+                "right": _counts(counter.right),
+                "total_played": {p.name: n for p, n in counter.total_played.items()},
+                "verify_warnings": [msg for func, msg in warnings if func == "verify_counts"],
+                "warnings": [msg for func, msg in warnings if func != "verify_counts"],
+            }
+        )
+        plays.clear()
+        warnings.clear()
+        game_end.clear()
+
+    # run() 在每局开始时调用 reset：先把上一局的结果记下来
+    original_reset = counter.reset
+
+    def reset_and_close() -> None:
+        close_game()
+        original_reset()
+
+    counter.reset = reset_and_close  # type: ignore[method-assign]
+
+    # run() 在游戏结束时调用 verify_counts，借此记下地主和最后出牌的玩家
+    original_verify = tracker.verify_counts
+
+    def verify_and_record(c: Counter, landlord: Player, last_player: Player) -> None:
+        game_end.update(landlord=landlord.name, last_player=last_player.name)
+        original_verify(c, landlord, last_player)
+
+    tracker.verify_counts = verify_and_record
+
+    def counted(frames: Iterator) -> Iterator:
+        nonlocal frames_read
+        for item in frames:
+            frames_read += 1
+            yield item
+
+    sink = logger.add(
+        lambda message: warnings.append((message.record["function"], message.record["message"])),
+        level="WARNING",
+    )
+    error: Optional[str] = None
+    start = perf_counter()
+    try:
+        frames = skip_popups(video_frames(path, start_frame, end_frame, sample_interval))
+        run(counted(frames), counter, Event(), on_update=on_update)
+    except StopIteration:
+        pass
+    except (Exception, SystemExit) as e:  # video_frames 打不开文件时会 sys.exit
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        elapsed = perf_counter() - start
+        logger.remove(sink)
+        tracker.verify_counts = original_verify
+    close_game()  # 录屏在一局中途结束时，未结束的这一局也记下来
+
+    return {
+        "file": path,
+        "error": error,
+        "frames": frames_read,
+        "seconds": round(elapsed, 3),
+        "frames_per_sec": round(frames_read / elapsed, 2) if elapsed > 0 else 0.0,
+        "games": games,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 按对局切分长录屏（在工作进程中执行）
+# ---------------------------------------------------------------------------
+
+
+def find_game_segments(path: str, scan_interval: float = _SCAN_INTERVAL) -> list[tuple[int, int]]:
+    """稀疏扫描录屏，找出每局的帧范围 [start, end)，供各段分别交给 run() 完整回放。
+
+    只每隔 scan_interval 秒解码一帧，并且只看判断对局边界所需的区域：
+    - 对局外：三个地主标记区域，出现地主标记说明对局已开始
+    - 对局内：底牌区域，出现三张底牌说明对局结束；地主标记消失也视为已结束（结束画面很短，可能恰好没采样到）
+    采样会错过真正的边界帧，所以段的起点取开始前最后一个没有地主标记的采样帧，
+    终点取检测到结束的采样帧之后，保证每段都完整包含一局，由 run() 逐帧找到精确的开始和结束。
+    两局之间的空白画面可能短于采样间隔：结束画面之后直接看到下一局的地主标记时，新段紧接上一段的终点开始。
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise OSError(f"无法打开视频文件: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    window_rect = (0, 0, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    step = max(1, round(scan_interval * fps))
+
+    landlord_regions = [region_to_pixels(r, window_rect) for r in LANDLORD_REGIONS.values()]
+    end_region = region_to_pixels("three_displayed_cards", window_rect)
+    warning = WarningDetector()
+    warning_region = region_to_pixels("warning_popup", window_rect)
+
+    segments: list[tuple[int, int]] = []
+    start: Optional[int] = None  # 当前对局段的起点，None 表示不在对局中
+    last_idle = 0  # 最近一个没有地主标记的采样帧
+    # 刚结束的一局在结束画面上还留着地主标记时为 (上一段的终点, 地主位置)，否则为 None。
+    # 此后同一位置的地主标记且底牌还在，说明仍是结束画面；地主位置变了或底牌消失，说明下一局已经开始，
+    # 新段从上一段的终点接着开始，中间不会漏掉帧
+    ended: Optional[tuple[int, int]] = None
+    scale = 1.0
+    try:
+        for frame_idx, gray in decode_frames(cap, 0, total, step):
+            if warning.check(gray, warning_region):
+                continue  # 警告弹窗可能挡住地主标记，这一帧不作判断
+            confidences = [match_mark(gray, region, Mark.LANDLORD, 1.0) for region in landlord_regions]
+            best = max(range(len(confidences)), key=confidences.__getitem__)
+            landlord_at = best if confidences[best] >= THRESHOLDS["landlord"] else None
+            if start is None:
+                if landlord_at is None:
+                    last_idle = frame_idx
+                    ended = None
+                    continue
+                if ended is not None:
+                    resume, ended_at = ended
+                    if landlord_at == ended_at and identify_cards(gray, end_region, scale):
+                        continue
+                    start = resume
+                else:
+                    start = last_idle
+                ended = None
+                scale = calibrate_scale(gray, window_rect)
+            elif landlord_at is None or identify_cards(gray, end_region, scale):
+                # 地主标记已消失时这一帧本身不属于该局，作为下一段可能的起点
+                end = min(frame_idx + 1, total) if landlord_at is not None else frame_idx
+                segments.append((start, end))
+                start = None
+                if landlord_at is None:
+                    last_idle = frame_idx
+                else:
+                    ended = (end, landlord_at)
+    finally:
+        cap.release()
+    if start is not None:
+        segments.append((start, total))  # 录屏在对局中途结束
+    logger.info(f"{path}: 稀疏扫描（每 {step} 帧取一帧）找到 {len(segments)} 局")
+    return segments
+
+
+def merge_segments(path: str, segments: list[tuple[int, int]], results: list[dict[str, Any]]) -> dict[str, Any]:
+    """把同一文件各段的回放结果按时间顺序合并为一个文件的结果，对局重新编号。"""
+    games: list[dict[str, Any]] = []
+    for (start, end), r in zip(segments, results):
+        for g in r["games"]:
+            games.append({**g, "game": len(games) + 1, "frames": [start, end]})
+    errors = [f"[{start}, {end}) {r['error']}" for (start, end), r in zip(segments, results) if r["error"]]
+    frames = sum(r["frames"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    return {
+        "file": path,
+        "error": "; ".join(errors) or None,
+        "frames": frames,
+        "seconds": round(seconds, 3),
+        "frames_per_sec": round(frames / seconds, 2) if seconds > 0 else 0.0,
+        "segments": [list(s) for s in segments],
+        "games": games,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 批量调度与报告
+# ---------------------------------------------------------------------------
+
+
+def collect_files(inputs: list[str]) -> list[str]:
+    """展开目录和通配符，返回去重后按输入顺序（同一目录/通配符内按文件名）排列的文件列表。"""
+    files: list[str] = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            matched = [str(f) for f in sorted(p.iterdir()) if f.suffix.lower() in _VIDEO_SUFFIXES]
+        elif p.is_file():
+            matched = [str(p)]
+        else:
+            matched = sorted(glob.glob(item))
+            if not matched:
+                logger.warning(f"没有匹配的文件: {item}")
+        files.extend(f for f in matched if f not in files)
+    return files
+
+
+def _failed(path: str, e: BaseException) -> dict[str, Any]:
+    """工作进程崩溃等情况下，代替回放结果的失败记录，只影响这一个文件（或这一段）。"""
+    return {"file": path, "error": f"{type(e).__name__}: {e}", "frames": 0,
+            "seconds": 0.0, "frames_per_sec": 0.0, "games": []}
+
+
+def replay_all(
+    files: list[str],
+    jobs: int,
+    sample_interval: float,
+    log_level: str,
+    scan_interval: Optional[float] = None,
+) -> dict[str, Any]:
+    """在进程池中回放所有文件，结果按文件列表的顺序排列，与完成先后无关。
+    scan_interval 不为 None 时先稀疏扫描切分每个文件（见 find_game_segments），
+    每一局作为独立任务回放，再按时间顺序合并回所属文件。
+    """
+    start = perf_counter()
+    results: list[dict[str, Any]] = []
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(log_level, jobs > 1)
+    ) as pool:
+        # 每个文件对应 (切分出的段, 各段的 future)；不切分时段为 None，只有一个整文件的 future
+        tasks: list[tuple[Optional[list[tuple[int, int]]], list[Future]]] = []
+        if scan_interval is None:
+            tasks = [(None, [pool.submit(replay_file, f, sample_interval)]) for f in files]
+        else:
+            scans = [pool.submit(find_game_segments, f, scan_interval) for f in files]
+            for path, scan in zip(files, scans):
+                try:
+                    segments = scan.result()
+                except Exception as e:
+                    logger.warning(f"{path}: 切分失败（{e}），整个文件作为一段回放")
+                    tasks.append((None, [pool.submit(replay_file, path, sample_interval)]))
+                    continue
+                tasks.append(
+                    (segments, [pool.submit(replay_file, path, sample_interval, s, e) for s, e in segments])
+                )
+
+        for i, (path, (segments, futures)) in enumerate(zip(files, tasks), 1):
+            parts = []
+            for future in futures:
+                try:
+                    parts.append(future.result())
+                except Exception as e:
+                    parts.append(_failed(path, e))
+            result = parts[0] if segments is None else merge_segments(path, segments, parts)
+            results.append(result)
+            status = f"失败（{result['error']}）" if result["error"] else (
+                f"{len(result['games'])} 局，{result['frames']} 帧，{result['frames_per_sec']} 帧/秒"
+            )
+            logger.info(f"[{i}/{len(files)}] {path}: {status}")
+    wall = perf_counter() - start
+
+    frames = sum(r["frames"] for r in results)
+    games = sum(len(r["games"]) for r in results)
+    summary = {
+        "files": len(results),
+        "failed": sum(1 for r in results if r["error"]),
+        "games": games,
+        "finished_games": sum(1 for r in results for g in r["games"] if g["finished"]),
+        "games_with_verify_warnings": sum(
+            1 for r in results for g in r["games"] if g["verify_warnings"]
+        ),
+        "frames": frames,
+        "wall_seconds": round(wall, 3),
+        "frames_per_sec": round(frames / wall, 2) if wall > 0 else 0.0,
+        "games_per_sec": round(games / wall, 4) if wall > 0 else 0.0,
+        "jobs": jobs,
+        "sample_interval": sample_interval,
+        "scan_interval": scan_interval,
+    }
+    return {"summary": summary, "files": results}
+
+
+def write_csv(report: dict[str, Any], path: str) -> None:
+    """每局一行；回放失败的文件单独一行，只填文件名和错误信息。"""
+    columns = [
+        "file", "game", "finished", "landlord", "last_player", "plays",
+        "total_remaining", "played_LEFT", "played_MIDDLE", "played_RIGHT",
+        "verify_warnings", "warnings", "error",
+    ]
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:  # 带 BOM，Excel 打开中文不乱码
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for r in report["files"]:
+            if r["error"]:
+                writer.writerow({"file": r["file"], "error": r["error"]})
+            for g in r["games"]:
+                writer.writerow(
+                    {
+                        "file": r["file"],
+                        "game": g["game"],
+                        "finished": g["finished"],
+                        "landlord": g["landlord"],
+                        "last_player": g["last_player"],
+                        "plays": len(g["plays"]),
+                        "total_remaining": sum(g["remaining"].values()),
+                        **{f"played_{p}": n for p, n in g["total_played"].items()},
+                        "verify_warnings": " | ".join(g["verify_warnings"]),
+                        "warnings": " | ".join(g["warnings"]),
+                        "error": "",
+                    }
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="记牌器批量录屏回放工具")
+    parser.add_argument("inputs", nargs="+", help="录屏文件、目录或通配符（如 \"recordings/*.mp4\"）")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数（默认 CPU 核数）")
+    parser.add_argument("--sample-interval", type=float, default=0.0, metavar="SECONDS", help="每隔多少秒取一帧（默认逐帧）")
+    parser.add_argument("--split", action="store_true", help="按对局切分每个录屏，各局并行回放（适合单个长录屏）")
+    parser.add_argument(
+        "--scan-interval",
+        type=float,
+        default=_SCAN_INTERVAL,
+        metavar="SECONDS",
+        help=f"--split 找对局边界时每隔多少秒取一帧（默认 {_SCAN_INTERVAL}）",
+    )
+    parser.add_argument("--json", metavar="FILE", help="JSON 报告输出路径")
+    parser.add_argument("--csv", metavar="FILE", help="CSV 报告输出路径（每局一行）")
+    parser.add_argument("--log-level", default="WARNING", metavar="LEVEL", help="工作进程的日志级别（默认 WARNING）")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    files = collect_files(args.inputs)
+    if not files:
+        logger.error("没有找到任何录屏文件")
+        sys.exit(1)
+    # 切分后任务数不再等于文件数，不按文件数限制进程数
+    jobs = max(1, args.jobs if args.split else min(args.jobs, len(files)))
+    logger.info(f"共 {len(files)} 个录屏文件，{jobs} 个进程")
+
+    scan_interval = args.scan_interval if args.split else None
+    report = replay_all(files, jobs, args.sample_interval, args.log_level.upper(), scan_interval)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"JSON 报告已保存到: {args.json}")
+    if args.csv:
+        write_csv(report, args.csv)
+        logger.info(f"CSV 报告已保存到: {args.csv}")
+    logger.info(json.dumps(report["summary"], ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+识别热点路径的基准测试。
+不需要游戏窗口，可在 Linux 上运行：在合成画面（以及可选的录屏帧）上分别计时
+identify_cards、match_mark、has_warning、calibrate_scale、region_to_pixels 和 NMS（nms_matches / nms_peaks），
+覆盖不同的 scale 和从空区域到 20 张手牌的不同张数。
+结果保存为 JSON（附带版本、环境和识别选项），可以用 --compare 与之前的结果逐项对比。
+
+用法：
+    python benchmark.py
+    python benchmark.py --scales 1.0 2.0 --cards 0 20 --repeat 50
+    python benchmark.py --video recording.mp4 --video-frames 20
+    python benchmark.py --only identify_cards nms --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from statistics import mean, median
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+import recognize
+from calibrate import calibrate_scale
+from capture import region_to_pixels
+from card_types import Card, Mark, Player
+from config import RECOGNITION, THRESHOLDS
+from recognize import TEMPLATE_BANK, ResultCache, has_warning, identify_cards, match_mark, nms_matches, nms_peaks
+from synthetic import REF_SIZE, render_frame
+
+# NMS 基准的模糊场景：裁剪图做 sigma = 3 * scale 的高斯模糊，再用较低的阈值取候选点，
+# 模拟模糊画面上一张牌周围大片像素都超过阈值的情况
+_NMS_BLUR_SIGMA = 3.0
+_NMS_BLUR_THRESHOLD = 0.5
+
+_BENCHMARKS = ("identify_cards", "match_mark", "has_warning", "calibrate_scale", "region_to_pixels", "nms")
+
+
+# ---------------------------------------------------------------------------
+# 合成画面
+# ---------------------------------------------------------------------------
+
+
+def synthetic_frame(
+    scale: float, n_cards: int, landlord: bool = True, warning: bool = False
+) -> tuple[np.ndarray, tuple[int, int, int, int]]:
+    """生成一帧 scale 倍参考分辨率的合成画面（见 synthetic.render_frame）：自己手里 n_cards 张牌（依次循环各种牌），
+    上家可选地显示地主标记，可选地显示警告弹窗标记。
+    """
+    cards = list(Card)
+    return render_frame(
+        round(REF_SIZE[0] * scale),
+        round(REF_SIZE[1] * scale),
+        scale,
+        landlord=Player.LEFT if landlord else None,
+        hand=[cards[i % len(cards)] for i in range(n_cards)],
+        warning=warning,
+    )
+
+
+def video_samples(path: str, count: int) -> list[tuple[int, np.ndarray]]:
+    """从录屏中均匀取 count 帧灰度图，返回 [(帧号, 灰度图)]。"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        logger.error(f"无法打开视频文件: {path}")
+        sys.exit(1)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    samples = []
+    try:
+        for idx in np.linspace(0, max(0, total - 1), num=min(count, max(total, 1)), dtype=int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ret, frame_bgr = cap.read()
+            if ret:
+                samples.append((int(idx), cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)))
+    finally:
+        cap.release()
+    logger.info(f"从录屏 {path} 中取了 {len(samples)} 帧")
+    return samples
+
+
+# ---------------------------------------------------------------------------
+# 计时
+# ---------------------------------------------------------------------------
+
+
+def _time(func: Callable[[], Any], repeat: int, number: int = 1) -> tuple[list[float], Any]:
+    """先调用一次预热（构建缩放模板等一次性开销不计入），再计时 repeat 轮，每轮连续调用 number 次。
+    返回每次调用的耗时（毫秒）列表和最后一次的返回值。
+    """
+    result = func()
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            result = func()
+        samples.append((perf_counter() - start) * 1000 / number)
+    return samples, result
+
+
+def _entry(name: str, params: dict[str, Any], samples: list[float], result: Any) -> dict[str, Any]:
+    ordered = sorted(samples)
+    return {
+        "name": name,
+        "params": params,
+        "runs": len(samples),
+        "min_ms": round(ordered[0], 4),
+        "median_ms": round(median(ordered), 4),
+        "mean_ms": round(mean(ordered), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "result": result,
+    }
+
+
+def bench_synthetic(scales: list[float], card_counts: list[int], repeat: int, only: set[str]) -> list[dict[str, Any]]:
+    entries = []
+    for scale in scales:
+        for n in card_counts:
+            frame, rect = synthetic_frame(scale, n)
+            region = region_to_pixels("my_cards", rect)
+            params = {"source": "synthetic", "scale": scale, "cards": n}
+
+            if "identify_cards" in only:
+                samples, found = _time(lambda: identify_cards(frame, region, scale), repeat)
+                entries.append(_entry("identify_cards", params, samples, sum(found.values())))
+
+            if "nms" in only:
+                x1, y1, x2, y2 = region
+                crop = frame[y1:y2, x1:x2]
+                t = TEMPLATE_BANK.cards(scale)[Card.THREE]
+                min_dist = max(t.shape[1] // 2, 5)
+                blurred = cv2.GaussianBlur(crop, (0, 0), _NMS_BLUR_SIGMA * scale)
+                for case, image, threshold in (
+                    ("clean", crop, THRESHOLDS["card"]),
+                    ("blurred", blurred, _NMS_BLUR_THRESHOLD),
+                ):
+                    res = cv2.matchTemplate(image, t, cv2.TM_CCOEFF_NORMED)
+
+                    def candidates() -> list[tuple[float, tuple[int, int]]]:
+                        ys, xs = np.where(res >= threshold)
+                        return [(float(res[y, x]), (int(x), int(y))) for y, x in zip(ys, xs)]
+
+                    # 两者都从热力图开始计时，nms_matches 包括取候选点列表的开销，与 nms_peaks 可以直接对比
+                    nms_params = {**params, "case": case, "candidates": len(candidates())}
+                    samples, kept = _time(lambda: nms_matches(candidates(), min_dist), repeat)
+                    entries.append(_entry("nms_matches", nms_params, samples, len(kept)))
+                    samples, kept = _time(lambda: nms_peaks(res, threshold, min_dist), repeat)
+                    entries.append(_entry("nms_peaks", nms_params, samples, len(kept)))
+
+            if "calibrate_scale" in only and n > 0:
+                samples, found = _time(lambda: calibrate_scale(frame, rect), repeat)
+                entries.append(_entry("calibrate_scale", params, samples, round(found, 3)))
+
+        # 以下几项与手牌张数无关，每个 scale 只测一次。
+        # 与 tracker 一致，标记在校准之前按原始尺寸匹配，scale 只影响画面和区域的大小
+        params = {"source": "synthetic", "scale": scale}
+        if "match_mark" in only:
+            for present in (True, False):
+                frame, rect = synthetic_frame(scale, 0, landlord=present)
+                region = region_to_pixels("remaining_cards_left", rect)
+                samples, conf = _time(lambda: match_mark(frame, region, Mark.LANDLORD, 1.0), repeat)
+                entries.append(_entry("match_mark", {**params, "present": present}, samples, round(conf, 3)))
+
+        if "has_warning" in only:
+            for present in (True, False):
+                frame, rect = synthetic_frame(scale, 17, warning=present)
+                region = region_to_pixels("warning_popup", rect)
+                samples, found = _time(lambda: has_warning(frame, 1.0, region), repeat)
+                entries.append(_entry("has_warning", {**params, "present": present}, samples, found))
+
+        if "region_to_pixels" in only:
+            rect = synthetic_frame(scale, 0)[1]
+            # 单次调用只有微秒级，每轮连续调用多次取平均
+            samples, _ = _time(lambda: region_to_pixels("my_cards", rect), repeat, number=1000)
+            entries.append(_entry("region_to_pixels", params, samples, None))
+    return entries
+
+
+def bench_video(path: str, count: int, repeat: int, only: set[str]) -> list[dict[str, Any]]:
+    """在录屏帧上计时各识别接口，同一接口（和区域）在所有帧上的耗时合并统计。"""
+    timings: dict[tuple[str, str], list[float]] = {}
+    results: dict[tuple[str, str], list[Any]] = {}
+
+    def record(name: str, region: str, func: Callable[[], Any]) -> None:
+        samples, result = _time(func, repeat)
+        timings.setdefault((name, region), []).extend(samples)
+        results.setdefault((name, region), []).append(result)
+
+    for _, gray in video_samples(path, count):
+        h, w = gray.shape
+        rect = (0, 0, w, h)
+        scale = calibrate_scale(gray, rect)
+        if "calibrate_scale" in only:
+            record("calibrate_scale", "my_cards", lambda: calibrate_scale(gray, rect))
+        if "identify_cards" in only:
+            for name in ("my_cards", "playing_left", "playing_middle", "playing_right", "three_displayed_cards"):
+                region = region_to_pixels(name, rect)
+                record("identify_cards", name, lambda: sum(identify_cards(gray, region, scale).values()))
+        if "match_mark" in only:
+            for name in ("remaining_cards_left", "remaining_cards_middle", "remaining_cards_right"):
+                region = region_to_pixels(name, rect)
+                record("match_mark", name, lambda: round(match_mark(gray, region, Mark.LANDLORD, 1.0), 3))
+        if "has_warning" in only:
+            region = region_to_pixels("warning_popup", rect)
+            record("has_warning", "warning_popup", lambda: has_warning(gray, 1.0, region))
+
+    return [
+        _entry(name, {"source": "video", "video": path, "region": region, "frames": len(results[(name, region)])},
+               samples, results[(name, region)])
+        for (name, region), samples in timings.items()
+    ]
+
+
+# ---------------------------------------------------------------------------
+# 报告
+# ---------------------------------------------------------------------------
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, timeout=5,
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment(repeat: int) -> dict[str, Any]:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "recognition": dict(RECOGNITION),
+        "thresholds": dict(THRESHOLDS),
+        "repeat": repeat,
+    }
+
+
+def _key(entry: dict[str, Any]) -> str:
+    return json.dumps([entry["name"], entry["params"]], sort_keys=True, ensure_ascii=False)
+
+
+def report_entries(entries: list[dict[str, Any]], baseline: Optional[dict[str, dict[str, Any]]] = None) -> None:
+    """每项结果写一行日志；传入 baseline 时附上相对基线的加速比。"""
+    for e in entries:
+        params = " ".join(f"{k}={v}" for k, v in e["params"].items() if k not in ("source", "video"))
+        line = f"{e['name']:<18} {params:<60} 中位数 {e['median_ms']:>9.4f} ms  最小 {e['min_ms']:>9.4f} ms"
+        old = (baseline or {}).get(_key(e))
+        if old and e["median_ms"] > 0:
+            line += f"  对比基线 {old['median_ms'] / e['median_ms']:.2f}x"
+        logger.info(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="记牌器识别热点路径基准测试")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.5, 0.75, 1.0, 1.5, 2.0], help="合成画面的 scale 列表")
+    parser.add_argument("--cards", type=int, nargs="+", default=[0, 1, 5, 10, 17, 20], help="合成手牌的张数列表")
+    parser.add_argument("--repeat", type=int, default=20, help="每项计时的轮数（默认 20）")
+    parser.add_argument("--only", nargs="+", choices=_BENCHMARKS, default=list(_BENCHMARKS), help="只测这些项目")
+    parser.add_argument("--video", metavar="FILE", help="额外在这个录屏的帧上计时")
+    parser.add_argument("--video-frames", type=int, default=10, help="从录屏中均匀取多少帧（默认 10）")
+    parser.add_argument("--no-synthetic", action="store_true", help="不测合成画面（只测 --video）")
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        default=f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json",
+        help="JSON 结果输出路径（默认 benchmark_<时间>.json）",
+    )
+    parser.add_argument("--compare", metavar="FILE", help="与之前保存的 JSON 结果对比，报告每项的加速比")
+    args = parser.parse_args()
+
+    logger.remove()
+    # 被测函数自身的 INFO/DEBUG 日志（如每次校准的结果）会淹没计时输出，只保留警告
+    logger.add(sys.stderr, level="INFO", filter={"": "WARNING", "__main__": "INFO"})
+    # 基准测试测量的是实际识别开销：关闭识别结果缓存，否则除第一次外都是缓存命中
+    recognize.RESULT_CACHE = ResultCache(0)
+
+    only = set(args.only)
+    entries = []
+    if not args.no_synthetic:
+        entries += bench_synthetic(args.scales, args.cards, args.repeat, only)
+    if args.video:
+        entries += bench_video(args.video, args.video_frames, args.repeat, only)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {_key(e): e for e in json.load(f)["results"]}
+    report_entries(entries, baseline)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": _environment(args.repeat), "results": entries}, f, ensure_ascii=False, indent=2)
+    logger.info(f"基准测试结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
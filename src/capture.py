@@ -3,8 +3,8 @@
 Windows-only（pygetwindow / mss）。
 """
 
-from time import sleep
-from typing import Optional
+from time import monotonic, sleep
+from typing import Iterable, Optional
 
 import cv2
 import mss
@@ -16,6 +16,14 @@ from config import GAME_WINDOW_TITLE, REGIONS
 # 类型别名
 GrayImage = np.ndarray  # shape (H, W), dtype uint8
 Rect = tuple[int, int, int, int]  # (x1, y1, x2, y2) 像素，相对于全屏
+# 帧来源产出的一帧：(灰度图, window_rect, 画面时刻)。画面时刻以秒为单位：
+# 实时截图是截图时的 monotonic()，录屏是该帧在视频中的时间，只用来与 run() 的 clock 相减计算延迟
+Frame = tuple[GrayImage, Rect, float]
+
+# 自动校准使用的区域：左/右/上 = my_cards 边界，下延伸到窗口底部（见 calibrate._calibrate）
+CALIBRATION_REGION = "my_cards_to_bottom"
+# 两个区域合并截图后的外接矩形面积不超过两者面积之和的这么多倍时，合并为一次截图
+_MERGE_SLACK = 1.2
 
 
 # ---------------------------------------------------------------------------
@@ -30,10 +38,9 @@ def _full_screen_rect() -> Rect:
         return (0, 0, m["width"], m["height"])
 
 
-def find_game_window() -> Rect:
-    """查找游戏窗口，返回其屏幕坐标 (x1, y1, x2, y2)。
-    找不到时 fallback 到全屏坐标。
-    仅在 Windows 上可用（依赖 pygetwindow）。
+def _enumerate_game_window():
+    """枚举所有顶层窗口，返回第一个标题含 GAME_WINDOW_TITLE 的 pygetwindow 窗口对象。
+    找不到或出错时返回 None 并记录原因。仅在 Windows 上可用（依赖 pygetwindow）。
     """
     try:
         import pygetwindow as gw
@@ -41,17 +48,77 @@ def find_game_window() -> Rect:
         wins = [w for w in gw.getAllWindows() if GAME_WINDOW_TITLE in w.title]
         if not wins:
             logger.warning(f"未找到标题含 '{GAME_WINDOW_TITLE}' 的窗口，将使用全屏截图")
-            return _full_screen_rect()
-        w = wins[0]
-        return (w.left, w.top, w.left + w.width, w.top + w.height)
+            return None
+        return wins[0]
     except ImportError:
         logger.warning("pygetwindow 不可用（非 Windows 环境），将截取全屏")
+    except Exception as e:
+        logger.warning(f"窗口定位失败: {e}")
+    return None
+
+
+def _window_rect(window) -> Rect:
+    # box 只调用一次 GetWindowRect；窗口已关闭时 pygetwindow 会抛出异常
+    left, top, width, height = window.box
+    return (left, top, left + width, top + height)
+
+
+def find_game_window() -> Rect:
+    """查找游戏窗口，返回其屏幕坐标 (x1, y1, x2, y2)。
+    找不到时 fallback 到全屏坐标。
+    每次调用都会重新枚举所有窗口；需要逐帧定位时请用 WindowLocator。
+    """
+    window = _enumerate_game_window()
+    if window is None:
         return _full_screen_rect()
+    try:
+        return _window_rect(window)
     except Exception as e:
         logger.warning(f"窗口定位失败: {e}")
         return _full_screen_rect()
 
 
+class WindowLocator:
+    """逐帧定位游戏窗口，供 live_frames 使用。
+    记住上次匹配到的窗口对象，之后每帧只读取它的位置（一次 GetWindowRect）；
+    只有窗口句柄失效（窗口关闭/重开）时才重新枚举所有窗口，
+    且重新枚举至少间隔 recheck_interval 秒，期间沿用上次的位置。
+    """
+
+    def __init__(self, recheck_interval: float = 2.0) -> None:
+        self._recheck_interval = recheck_interval
+        self._window = None
+        self._last_rect: Optional[Rect] = None
+        self._last_enumeration = float("-inf")
+
+    def locate(self) -> Rect:
+        if self._window is not None:
+            try:
+                self._last_rect = _window_rect(self._window)
+                return self._last_rect
+            except Exception:
+                logger.info("游戏窗口句柄已失效，将重新查找窗口")
+                self._window = None
+
+        now = monotonic()
+        if self._last_rect is not None and now - self._last_enumeration < self._recheck_interval:
+            return self._last_rect
+        self._last_enumeration = now
+
+        window = _enumerate_game_window()
+        if window is not None:
+            try:
+                self._last_rect = _window_rect(window)
+                self._window = window
+                logger.debug(f"已定位游戏窗口: {self._last_rect}")
+                return self._last_rect
+            except Exception as e:
+                logger.warning(f"窗口定位失败: {e}")
+        # 找不到窗口时用全屏坐标；屏幕尺寸也只在重新枚举时才查询
+        self._last_rect = _full_screen_rect()
+        return self._last_rect
+
+
 # ---------------------------------------------------------------------------
 # 截图
 # ---------------------------------------------------------------------------
@@ -74,11 +141,139 @@ def _grab_gray(bbox: Optional[tuple] = None) -> GrayImage:
     return cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY)
 
 
+class CaptureSession:
+    """长期持有的截图会话，供 live_frames 在整个追踪过程中复用。
+    复用同一个 mss 句柄，避免每帧重新创建；mss 返回的 BGRA 原始缓冲区直接零拷贝包装成数组，
+    转换出的灰度图写入预先分配、按窗口尺寸复用的缓冲区。
+    注意：每次 grab 返回的都是同一块缓冲区，调用方若要跨帧保留图像需自行 copy()。
+    mss 句柄与创建它的线程绑定，必须在使用它的线程里创建。
+    """
+
+    def __init__(self) -> None:
+        self._sct = mss.mss()
+        self._gray: Optional[GrayImage] = None
+        # 按区域截图时使用的整窗口画布，只有本次截取的区域是最新内容
+        self._canvas: Optional[GrayImage] = None
+
+    def __enter__(self) -> "CaptureSession":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._sct.close()
+
+    def reopen(self) -> None:
+        """截图失败（如锁屏后句柄失效）时重建 mss 句柄。"""
+        try:
+            self._sct.close()
+        except Exception:
+            pass
+        self._sct = mss.mss()
+
+    def grab(self, bbox: Optional[Rect] = None) -> GrayImage:
+        """截取屏幕（或指定区域）并转为灰度图，写入复用的缓冲区后返回。"""
+        monitor = (
+            {"left": bbox[0], "top": bbox[1], "width": bbox[2] - bbox[0], "height": bbox[3] - bbox[1]}
+            if bbox
+            else self._sct.monitors[0]
+        )
+        raw = self._sct.grab(monitor)
+        bgra = np.frombuffer(raw.raw, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+        # 窗口尺寸变化时才重新分配缓冲区
+        if self._gray is None or self._gray.shape != (raw.height, raw.width):
+            self._gray = np.empty((raw.height, raw.width), dtype=np.uint8)
+            logger.debug(f"截图缓冲区已重新分配: {raw.width}x{raw.height}")
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self._gray)
+        return self._gray
+
+    @property
+    def canvas(self) -> Optional[GrayImage]:
+        return self._canvas
+
+    def grab_regions(self, window_rect: Rect, names: Iterable[str]) -> dict[str, GrayImage]:
+        """只截取并转换指定区域，返回 {区域名: 灰度裁剪图}。
+        各区域写入与窗口等大的复用画布（见 canvas）的对应位置，返回值是画布上的视图，
+        因此画布可以直接当作整帧交给 run()，但未请求的区域保留的是旧内容。
+        相邻或重叠的区域合并为一次截图，减少 mss 调用次数。
+        """
+        wx1, wy1, wx2, wy2 = window_rect
+        shape = (wy2 - wy1, wx2 - wx1)
+        if self._canvas is None or self._canvas.shape != shape:
+            self._canvas = np.zeros(shape, dtype=np.uint8)
+            logger.debug(f"区域截图画布已重新分配: {shape[1]}x{shape[0]}")
+
+        rects = {name: _clip(region_rect(name, window_rect), shape) for name in names}
+        for x1, y1, x2, y2 in _merge_rects([r for r in rects.values() if r[2] > r[0] and r[3] > r[1]]):
+            raw = self._sct.grab({"left": wx1 + x1, "top": wy1 + y1, "width": x2 - x1, "height": y2 - y1})
+            bgra = np.frombuffer(raw.raw, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+            cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self._canvas[y1:y2, x1:x2])
+        return {name: self._canvas[y1:y2, x1:x2] for name, (x1, y1, x2, y2) in rects.items()}
+
+
+class RegionPlan:
+    """run() 与帧来源之间共享的"下一帧需要哪些区域"的约定（与 stop_event 一样由双方共同持有）。
+    run() 在阶段切换时调用 request() 声明接下来需要的区域，帧来源据此只截取这些区域；
+    尚未声明任何区域时截取整个窗口。
+    """
+
+    def __init__(self) -> None:
+        self._names: frozenset[str] = frozenset()
+        # 每次 request 加一，截图流水线据此丢弃切换区域之前截取的帧
+        self.generation = 0
+
+    def request(self, names: Iterable[str]) -> None:
+        # 整体替换而不是原地修改，另一个线程读到的始终是完整的一组区域
+        self._names = frozenset(names)
+        self.generation += 1
+        logger.debug(f"截图区域切换为: {sorted(self._names)}")
+
+    @property
+    def names(self) -> frozenset[str]:
+        return self._names
+
+
+def _clip(rect: Rect, shape: tuple[int, int]) -> Rect:
+    h, w = shape
+    x1, y1, x2, y2 = rect
+    return (max(0, x1), max(0, y1), min(w, x2), min(h, y2))
+
+
+def _area(rect: Rect) -> int:
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+def _merge_rects(rects: list[Rect]) -> list[Rect]:
+    """把外接矩形几乎不浪费像素的区域两两合并（如左右相邻的出牌区），直到无法再合并。"""
+    merged = list(rects)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                union = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                if _area(union) <= _MERGE_SLACK * (_area(a) + _area(b)):
+                    merged[i] = union
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
 def take_screenshot(
-    window_rect: Optional[Rect] = None, stop_event=None
+    window_rect: Optional[Rect] = None,
+    stop_event=None,
+    session: Optional[CaptureSession] = None,
+    regions: Optional[Iterable[str]] = None,
 ) -> Optional[GrayImage]:
     """截取游戏窗口截图（灰度）。
     window_rect 为 None 时截全屏（Linux / 窗口未找到时的 fallback）。
+    传入 session 时复用其 mss 句柄和灰度缓冲区，否则每次临时创建。
+    同时传入 session、window_rect 和非空的 regions 时只截取这些区域，返回 session 的整窗口画布。
     截图失败（如屏幕超时锁屏）时每 2 秒自动重试，直到成功或收到停止信号为止。
     收到停止信号时返回 None。
     """
@@ -86,12 +281,17 @@ def take_screenshot(
     logger.debug("正在截图...")
     while True:
         try:
-            return _grab_gray(bbox)
+            if session is not None and window_rect is not None and regions:
+                session.grab_regions(window_rect, regions)
+                return session.canvas
+            return session.grab(bbox) if session is not None else _grab_gray(bbox)
         except Exception:
             if stop_event is not None and stop_event.is_set():
                 return None
             logger.warning("截图失败（屏幕可能已超时），2 秒后重试")
             sleep(2)
+            if session is not None:
+                session.reopen()
 
 
 # ---------------------------------------------------------------------------
@@ -115,3 +315,11 @@ def region_to_pixels(region_name: str, window_rect: Rect) -> Rect:
         round(rx2 * w),
         round(ry2 * h),
     )
+
+
+def region_rect(region_name: str, window_rect: Rect) -> Rect:
+    """与 region_to_pixels 相同，额外支持 CALIBRATION_REGION 这个派生区域。"""
+    if region_name == CALIBRATION_REGION:
+        x1, y1, x2, _ = region_to_pixels("my_cards", window_rect)
+        return (x1, y1, x2, window_rect[3] - window_rect[1])
+    return region_to_pixels(region_name, window_rect)
@@ -34,14 +34,27 @@ raw_config: dict = _cfg
 REGIONS: dict = _cfg["REGIONS"]
 # 各项检测的置信度/占比阈值
 THRESHOLDS: dict = _cfg["THRESHOLDS"]
+# 识别引擎等识别方式相关选项
+RECOGNITION: dict = _cfg["RECOGNITION"]
 SCREENSHOT_INTERVAL: float = _cfg["SCREENSHOT_INTERVAL"]
 GAME_START_INTERVAL: float = _cfg["GAME_START_INTERVAL"]
+# 游戏进行中自适应截图间隔的上下限与退避倍数
+SCHEDULER: dict = _cfg["SCHEDULER"]
+# 警告弹窗检测的节奏与粗匹配参数
+WARNING_CHECK: dict = _cfg["WARNING_CHECK"]
+# 截图方式（是否只截取当前阶段需要的区域）
+CAPTURE: dict = _cfg["CAPTURE"]
 # 用于 pygetwindow 定位游戏窗口的标题关键字
 GAME_WINDOW_TITLE: str = _cfg["GAME_WINDOW_TITLE"]
 GUI: dict = _cfg["GUI"]
 HOTKEYS: dict = _cfg["HOTKEYS"]
 LOG_LEVEL: str = _cfg["LOG_LEVEL"]
 LOG_RETENTION: int = _cfg["LOG_RETENTION"]
+# 分阶段耗时统计的开关、统计窗口和定期输出间隔
+PROFILING: dict = _cfg["PROFILING"]
+# 对局录制的开关、分块大小、磁盘占用上限；录制目录的相对路径相对于配置文件所在目录
+RECORDING: dict = _cfg["RECORDING"]
+RECORDINGS_DIR: Path = _config_dir() / RECORDING.get("DIR", "recordings")
 
 # 模板图片目录（始终相对于源码位置，不受打包影响——PyInstaller 会把 templates/ 解包到此处）
 TEMPLATES_DIR: Path = Path(__file__).parent / "templates"
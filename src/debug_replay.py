@@ -7,23 +7,35 @@
     python debug_replay.py recording.mp4
     python debug_replay.py recording.mp4 --sample-interval 0.5
     python debug_replay.py recording.mp4 --start-time 1:30 --end-time 5:00
+    python debug_replay.py recording.mp4 --check-pyramid 2
+    python debug_replay.py recording.mp4 --result-cache cache.json
+    python debug_replay.py recording.mp4 --profile
+    python debug_replay.py recording.mp4 --sample-interval 0.5 --latency latency.json
+    python debug_replay.py recordings/session_20250101_200000   # 回放 config.yaml 的 RECORDING 录下的会话目录
+    python debug_replay.py recording.mp4.frames                  # 回放 frame_store.py 生成的帧库，不再解码视频
 """
 
 import argparse
+import json
 import sys
+from functools import partial
 from pathlib import Path
 from threading import Event
-from typing import Iterator
+from time import perf_counter
+from typing import Callable, Iterator, Optional
 
 import cv2
 import numpy as np
 from loguru import logger
 
-from capture import region_to_pixels
-from config import LOG_RETENTION, REGIONS
-from recognize import has_warning
+from capture import Rect, region_to_pixels
+from config import LOG_RETENTION, RECOGNITION, REGIONS, THRESHOLDS
+from frame_store import PREFETCH_FRAMES, FrameStore, decode_frames, is_frame_store, prefetch
+from profiling import TIMERS
+from recognize import RESULT_CACHE, WarningDetector
+from recorder import Recording, is_recording
 import tracker
-from tracker import Counter, run
+from tracker import CARDS, PLAY_REGIONS, Counter, Frame, PlayTiming, run
 
 
 # ---------------------------------------------------------------------------
@@ -33,13 +45,18 @@ from tracker import Counter, run
 logger.remove()
 
 
+# 出牌区与识别出这手牌时的画面平均灰度差低于此值，视为这手牌已经出现在画面上
+_APPEAR_DIFF = 6.0
+
+
 def video_frames(
     path: str, start_frame: int = 0, end_frame: int = 0, sample_interval: float = 0.0
-) -> Iterator[tuple[np.ndarray, tuple[int, int, int, int]]]:
-    """从视频文件逐帧读取，产出 (灰度图, window_rect)。
+) -> Iterator[Frame]:
+    """从视频文件逐帧读取，产出 (灰度图, window_rect, 该帧在视频中的时间)。警告弹窗由调用方用 skip_popups 过滤。
     window_rect 用视频的实际分辨率构造为 (0, 0, width, height)，
     region_to_pixels 直接用录制时的分辨率做坐标转换，无需任何 fallback。
     scale 由 run() 在地主确定后自动校准。
+    解码和灰度转换在后台线程中提前进行（见 prefetch），采样时跳过的帧不解码（见 decode_frames）。
     """
     cap = cv2.VideoCapture(path)
     if not cap.isOpened():
@@ -65,36 +82,153 @@ def video_frames(
         logger.info(f"跳转到第 {start_frame} 帧")
 
     step = max(1, round(sample_interval * fps)) if sample_interval > 0 else 1
-    frame_idx = start_frame
-    while frame_idx < stop_at:
-        ret, frame_bgr = cap.read()
-        if not ret:
-            logger.info("视频读取完毕")
-            break
+    decoded = prefetch(decode_frames(cap, start_frame, stop_at, step), PREFETCH_FRAMES)
+    try:
+        for frame_idx, gray in decoded:
+            logger.debug(f"当前帧: {frame_idx}/{total}")
+            yield gray, window_rect, frame_idx / fps
+    finally:
+        decoded.close()  # 等解码线程退出后再释放 cap
+        cap.release()
+
+
+def skip_popups(frames: Iterator[Frame]) -> Iterator[Frame]:
+    """跳过检测到警告弹窗的帧，与 live_frames 的处理一致。"""
+    warning = WarningDetector()
+    for gray, window_rect, timestamp in frames:
+        with TIMERS.stage("has_warning"):
+            has_popup = warning.check(gray, region_to_pixels("warning_popup", window_rect))
+        if has_popup:
+            TIMERS.count("popup_frames_skipped")
+            continue  # 检测到警告弹窗，跳过该帧
+        yield gray, window_rect, timestamp
 
-        # 跳过中间帧：顺序读取比 seek 快得多
-        if (frame_idx - start_frame) % step != 0:
-            frame_idx += 1
-            continue
 
-        # OpenCV 读出的是 BGR，直接转灰度即可（与正式程序的截图处理等价）
-        gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+class ReplayClock:
+    """按视频时间走的时钟，传给 run() 的 clock 参数代替 monotonic。
+    读数 = 当前帧在视频中的时间 + 从取到这一帧起实际花掉的处理时间，
+    即假设识别跟得上采样节奏、每一帧都在画面出现的那一刻被截到。
+    同时记下当前帧和上一个采样帧的时间，供 LatencyReport 回查这手牌是什么时候出现的。
+    """
 
-        logger.debug(f"当前帧: {frame_idx}/{total}")
+    def __init__(self) -> None:
+        self.frame: Optional[np.ndarray] = None
+        self.window_rect = (0, 0, 0, 0)
+        self.frame_time = 0.0
+        self.previous_time: Optional[float] = None  # 上一个交给 run() 的帧的时间，第一帧之前为 None
+        self._start = perf_counter()
 
-        if has_warning(gray, 1.0):
-            frame_idx += 1
-            continue  # 检测到警告弹窗，跳过该帧
+    def wrap(self, frames: Iterator[Frame]) -> Iterator[Frame]:
+        for item in frames:
+            if self.frame is not None:
+                self.previous_time = self.frame_time
+            self.frame, self.window_rect, self.frame_time = item
+            self._start = perf_counter()
+            yield item
 
-        yield gray, window_rect
+    def now(self) -> float:
+        return self.frame_time + perf_counter() - self._start
 
-        frame_idx += 1
 
-    cap.release()
+# 取出两个时刻之间各帧某一区域的小图：(上一个采样帧的时间, 识别帧的时间, 区域) → (时间, 小图) 迭代器
+CropsBetweenFn = Callable[[Optional[float], float, Rect], Iterator[tuple[float, np.ndarray]]]
 
 
-def parse_timestamp(ts: str, fps: float) -> int:
-    """将时间戳字符串（秒数或 MM:SS 或 HH:MM:SS）转换为帧号。"""
+def video_crops_between(
+    path: str, fps: float, previous_time: Optional[float], frame_time: float, region: Rect
+) -> Iterator[tuple[float, np.ndarray]]:
+    """重新解码录屏中 (previous_time, frame_time) 之间的各帧，产出 (时间, region 的灰度小图)。"""
+    if previous_time is None:
+        return
+    first, stop = round(previous_time * fps) + 1, round(frame_time * fps)
+    if first >= stop:
+        return
+    x1, y1, x2, y2 = region
+    cap = cv2.VideoCapture(path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        for idx in range(first, stop):
+            ret, frame_bgr = cap.read()
+            if not ret:
+                return
+            yield idx / fps, cv2.cvtColor(frame_bgr[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    finally:
+        cap.release()
+
+
+class LatencyReport:
+    """逐手统计从出牌出现在画面上到计数更新的延迟（视频时间）。
+    识别时只记下出牌区的画面；回放结束后重新读取上一个采样帧与识别帧之间的每一帧（见 CropsBetweenFn），
+    找到出牌区第一次与识别帧一致的那一帧作为出现时刻。
+    延迟 = 等待采样（出现 → 被采样到）+ 识别处理（采样到 → 计数更新）。
+    """
+
+    def __init__(self, path: str, crops_between: CropsBetweenFn, clock: ReplayClock) -> None:
+        self.path = path
+        self.clock = clock
+        self._crops_between = crops_between
+        self._pending: list[tuple[PlayTiming, Optional[float], Rect, np.ndarray]] = []
+
+    def on_timing(self, timing: PlayTiming) -> None:
+        x1, y1, x2, y2 = region = region_to_pixels(PLAY_REGIONS[timing.player], self.clock.window_rect)
+        assert self.clock.frame is not None
+        crop = self.clock.frame[y1:y2, x1:x2].copy()
+        self._pending.append((timing, self.clock.previous_time, region, crop))
+
+    def _appeared_at(self, previous_time: Optional[float], frame_time: float, region: Rect, crop: np.ndarray) -> float:
+        """在 (上一个采样帧, 识别帧] 之间找出牌区第一次与识别帧一致的时刻。"""
+        target = crop.astype(np.int16)
+        for t, candidate in self._crops_between(previous_time, frame_time, region):
+            if candidate.shape == target.shape and np.abs(candidate.astype(np.int16) - target).mean() < _APPEAR_DIFF:
+                return t
+        return frame_time
+
+    def build(self) -> list[dict]:
+        rows = []
+        for timing, previous_time, region, crop in self._pending:
+            appeared = self._appeared_at(previous_time, timing.frame_time, region, crop)
+            rows.append({
+                "player": timing.player.name,
+                "cards": {c.value: n for c, n in timing.cards.items()},
+                "appeared": round(appeared, 3),
+                "sampled": round(timing.frame_time, 3),
+                "counted": round(timing.counted_at, 3),
+                "wait_ms": round((timing.frame_time - appeared) * 1000, 1),
+                "process_ms": round(timing.latency * 1000, 1),
+                "latency_ms": round((timing.counted_at - appeared) * 1000, 1),
+            })
+        return rows
+
+    def report(self, output: Optional[str] = None) -> None:
+        rows = self.build()
+        if not rows:
+            logger.info("延迟统计：没有识别到出牌")
+            return
+        lines = [f"{'出现':>9}  {'采样':>9}  {'等待采样':>8}  {'识别处理':>8}  {'总延迟':>8}  玩家"]
+        for row in rows:
+            lines.append(
+                f"{row['appeared']:>9.3f}  {row['sampled']:>9.3f}  {row['wait_ms']:>8.1f}  "
+                f"{row['process_ms']:>8.1f}  {row['latency_ms']:>8.1f}  {row['player']}"
+            )
+        summary = {}
+        for key in ("wait_ms", "process_ms", "latency_ms"):
+            values = np.array([row[key] for row in rows])
+            p50, p95 = np.percentile(values, [50, 95])
+            summary[key] = {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "max": round(float(values.max()), 1)}
+        lines.append(
+            f"共 {len(rows)} 手，总延迟 p50 {summary['latency_ms']['p50']}ms  p95 {summary['latency_ms']['p95']}ms  "
+            f"最大 {summary['latency_ms']['max']}ms（其中等待采样 p95 {summary['wait_ms']['p95']}ms，"
+            f"识别处理 p95 {summary['process_ms']['p95']}ms）"
+        )
+        logger.info("从画面到计数的延迟（视频时间，单位 ms）：\n" + "\n".join(lines))
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump({"video": self.path, "summary": summary, "plays": rows}, f, ensure_ascii=False, indent=2)
+            logger.info(f"延迟统计已保存到: {output}")
+
+
+def parse_seconds(ts: str) -> float:
+    """将时间戳字符串（秒数或 MM:SS 或 HH:MM:SS）转换为秒数。"""
     parts = ts.split(":")
     try:
         if len(parts) == 1:
@@ -106,7 +240,12 @@ def parse_timestamp(ts: str, fps: float) -> int:
     except ValueError:
         logger.error(f"无法解析时间戳: {ts}，格式应为秒数、MM:SS 或 HH:MM:SS")
         sys.exit(1)
-    return round(seconds * fps)
+    return seconds
+
+
+def parse_timestamp(ts: str, fps: float) -> int:
+    """将时间戳字符串（秒数或 MM:SS 或 HH:MM:SS）转换为帧号。"""
+    return round(parse_seconds(ts) * fps)
 
 
 def dump_regions(video_path: str, output_path: str, frame_index: int = 0, timestamp: str = "") -> None:
@@ -153,13 +292,54 @@ def dump_regions(video_path: str, output_path: str, frame_index: int = 0, timest
     logger.info(f"区域示意图已保存到: {output_path}")
 
 
+class PyramidCheck:
+    """金字塔匹配准确性核对：替换 tracker 使用的识别函数，每次调用都分别用金字塔模式和全分辨率各跑一次，
+    统计两者结果不一致的次数。回放流程本身使用全分辨率的结果，保证核对不影响计牌。
+    """
+
+    def __init__(self, levels: int) -> None:
+        self.levels = levels
+        self.calls = 0
+        self.mismatches = 0
+        for name in ("identify_cards", "identify_cards_batch", "match_mark"):
+            setattr(tracker, name, self._wrap(name, getattr(tracker, name)))
+
+    def _run(self, func, levels, *args):
+        saved = RECOGNITION.get("PYRAMID_LEVELS", 0)
+        RECOGNITION["PYRAMID_LEVELS"] = levels
+        try:
+            return func(*args)
+        finally:
+            RECOGNITION["PYRAMID_LEVELS"] = saved
+
+    def _wrap(self, name, func):
+        def wrapper(*args):
+            full = self._run(func, 0, *args)
+            pyramid = self._run(func, self.levels, *args)
+            self.calls += 1
+            if name == "match_mark":
+                # 标记匹配只关心是否过阈值，置信度的微小差异不算不一致
+                threshold = THRESHOLDS.get(args[2].name.lower(), 0.9)
+                same = (full >= threshold) == (pyramid >= threshold)
+            else:
+                same = full == pyramid
+            if not same:
+                self.mismatches += 1
+                logger.warning(f"金字塔结果不一致 [{name}]: 全分辨率 {full}，金字塔 {pyramid}")
+            return full
+        return wrapper
+
+    def report(self) -> None:
+        logger.info(
+            f"金字塔核对（{self.levels} 层）: 共 {self.calls} 次识别，不一致 {self.mismatches} 次"
+        )
+
+
 def make_on_update(counter):
     def on_update(player, cards):
         cards_str = ", ".join(f"{c.value}×{n}" for c, n in cards.items())
         remaining_str = "  ".join(
-            f"{c.value}:{counter.remaining[c].get()}"
-            for c in counter.remaining
-            if counter.remaining[c].get() < 4
+            f"{c.value}:{n}" for c, n in zip(CARDS, counter.remaining) if n < 4
         )
         logger.info(f"{player.value} 出牌: {cards_str} | 剩余: {remaining_str} （共{counter.total_remaining}张）")
     return on_update
@@ -167,7 +347,7 @@ def make_on_update(counter):
 
 def main():
     parser = argparse.ArgumentParser(description="记牌器录屏回放调试工具")
-    parser.add_argument("video", help="录屏文件路径")
+    parser.add_argument("video", help="录屏文件路径、RECORDING 录下的会话目录，或 frame_store.py 生成的帧库目录")
     parser.add_argument("--start-frame", type=int, default=0, help="从第几帧开始")
     parser.add_argument("--start-time", metavar="TIME", help="开始时间戳（秒数、MM:SS 或 HH:MM:SS），优先于 --start-frame")
     parser.add_argument("--end-frame", type=int, default=0, help="到第几帧结束（默认播放到结尾）")
@@ -175,6 +355,30 @@ def main():
     parser.add_argument("--sample-interval", type=float, default=0.0, metavar="SECONDS", help="每隔多少秒取一帧（默认逐帧）")
     parser.add_argument("--quiet", action="store_true", help="压制像素未变的 DEBUG 日志")
     parser.add_argument("--log-level", default="INFO", metavar="LEVEL", help="日志级别：TRACE/DEBUG/INFO/WARNING/ERROR（默认 INFO）")
+    parser.add_argument(
+        "--check-pyramid",
+        type=int,
+        default=0,
+        metavar="LEVELS",
+        help="核对指定层数的金字塔匹配与全分辨率匹配的结果是否一致（回放本身使用全分辨率结果）",
+    )
+    parser.add_argument(
+        "--result-cache",
+        metavar="FILE",
+        help="回放前从该 JSON 文件载入识别结果缓存、结束后写回；换不同选项重复回放同一段录屏时复用识别结果",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="记录各阶段耗时，回放结束时输出 p50/p95/p99 统计（不受 config.yaml 的 PROFILING.ENABLED 影响）",
+    )
+    parser.add_argument(
+        "--latency",
+        nargs="?",
+        const="",
+        metavar="OUTPUT",
+        help="统计每手牌从出现在画面上到计数更新的延迟（视频时间），回放结束时输出 p50/p95；给出文件名时另存为 JSON",
+    )
     parser.add_argument(
         "--dump-regions",
         metavar="OUTPUT",
@@ -208,27 +412,36 @@ def main():
         rotation="00:00",
     )
 
+    recording = Recording(args.video) if is_recording(args.video) else None
+    store = FrameStore(args.video) if is_frame_store(args.video) else None
+
     if args.dump_regions:
+        if recording is not None or store is not None:
+            logger.error("--dump-regions 请直接使用录屏文件")
+            sys.exit(1)
         dump_regions(args.video, args.dump_regions, args.dump_frame, args.dump_time or "")
         return
 
-    # 录屏回放不需要 sleep，patch 掉避免浪费时间
-    tracker.sleep = lambda _: None
-
-    import tkinter as tk
-    _root = tk.Tk()
-    _root.withdraw()  # 隐藏窗口，仅用于满足 tk.IntVar 的依赖
+    pyramid_check = PyramidCheck(args.check_pyramid) if args.check_pyramid > 0 else None
+    if args.result_cache:
+        try:
+            RESULT_CACHE.load(Path(args.result_cache))
+        except ValueError as e:
+            logger.error(e)
+            sys.exit(1)
+    if args.profile:
+        TIMERS.enabled = True
 
     counter = Counter()
     stop_event = Event()
 
     def print_result():
-        from card_types import Card as C, Player as P
+        from card_types import Player as P
         lines = ["====== 本局计牌结果 ======", f"{'牌':>6}  {'剩余':>4}  {'上家':>4}  {'下家':>4}", "-" * 30]
-        for card in C:
-            r = counter.remaining[card].get()
-            l = counter.left[card].get()
-            ri = counter.right[card].get()
+        for i, card in enumerate(CARDS):
+            r = counter.remaining[i]
+            l = counter.left[i]
+            ri = counter.right[i]
             lines.append(f"{card.value:>6}  {r:>4}  {l:>4}  {ri:>4}")
         lines.append(f"总剩余: {counter.total_remaining}")
         for player in P:
@@ -242,26 +455,60 @@ def main():
         _original_reset()
     counter.reset = _reset_with_print
 
-    # 解析开始/结束时间戳（需要先探一下 fps）
-    cap_probe = cv2.VideoCapture(args.video)
-    probe_fps = cap_probe.get(cv2.CAP_PROP_FPS) or 30
-    cap_probe.release()
-
-    start_frame = parse_timestamp(args.start_time, probe_fps) if args.start_time else args.start_frame
-    end_frame = parse_timestamp(args.end_time, probe_fps) if args.end_time else args.end_frame
+    crops_between: CropsBetweenFn
+    if recording is not None:
+        # 会话目录的帧间隔不固定，开始/结束时间按录制时间换算为帧号
+        start_frame = recording.index_at(parse_seconds(args.start_time)) if args.start_time else args.start_frame
+        end_frame = recording.index_at(parse_seconds(args.end_time)) if args.end_time else args.end_frame
+        logger.info(f"会话目录: {len(recording)} 帧，时长 {recording.times[-1]:.1f}s")
+        source = recording.frames(start_frame, end_frame, args.sample_interval)
+        crops_between = recording.crops_between
+    elif store is not None:
+        # 帧库保留了原录屏的帧号，开始/结束帧号和时间戳都按原录屏换算
+        start_frame = parse_timestamp(args.start_time, store.fps) if args.start_time else args.start_frame
+        end_frame = parse_timestamp(args.end_time, store.fps) if args.end_time else args.end_frame
+        logger.info(f"帧库: {len(store)} 帧（{'只含区域' if store.index['roi'] else '整帧'}），来自 {store.source}")
+        source = skip_popups(store.frames(start_frame, end_frame, args.sample_interval))
+        crops_between = store.crops_between
+    else:
+        # 解析开始/结束时间戳（需要先探一下 fps）
+        cap_probe = cv2.VideoCapture(args.video)
+        probe_fps = cap_probe.get(cv2.CAP_PROP_FPS) or 30
+        cap_probe.release()
+
+        start_frame = parse_timestamp(args.start_time, probe_fps) if args.start_time else args.start_frame
+        end_frame = parse_timestamp(args.end_time, probe_fps) if args.end_time else args.end_frame
+        source = skip_popups(
+            video_frames(args.video, start_frame=start_frame, end_frame=end_frame, sample_interval=args.sample_interval)
+        )
+        crops_between = partial(video_crops_between, args.video, probe_fps)
 
-    # 用视频帧迭代器替换实时截图，传入同一个 run() 函数
-    frames = video_frames(args.video, start_frame=start_frame, end_frame=end_frame, sample_interval=args.sample_interval)
+    # 用录屏或会话目录的帧迭代器替换实时截图，传入同一个 run() 函数；
+    # run() 的时钟按视频时间走，出牌的计数时刻与帧的时间戳可以直接相减
+    clock = ReplayClock()
+    frames = clock.wrap(source)
+    latency = LatencyReport(args.video, crops_between, clock) if args.latency is not None else None
 
     logger.info(f"开始回放: {args.video}")
     try:
-        run(frames, counter, stop_event, on_update=make_on_update(counter))
+        run(
+            frames, counter, stop_event, on_update=make_on_update(counter),
+            clock=clock.now, on_timing=latency.on_timing if latency else None,
+        )
     except StopIteration:
         pass
     except KeyboardInterrupt:
         logger.info("用户中断")
 
-    pass
+    if pyramid_check is not None:
+        pyramid_check.report()
+    logger.info(RESULT_CACHE.summary())
+    if TIMERS.enabled:
+        TIMERS.report()
+    if latency is not None:
+        latency.report(args.latency or None)
+    if args.result_cache:
+        RESULT_CACHE.save(Path(args.result_cache))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+"""
+预解码帧库。
+把录屏一次性解码为灰度帧写入磁盘，之后 debug_replay 直接以内存映射（np.memmap）读取，不再解码视频。
+反复回放同一段录屏调整 THRESHOLDS 时，第二次起的回放开销基本只剩识别本身。
+
+帧库是一个目录（默认为录屏文件名加 .frames）：
+    index.json        录屏路径、fps、分辨率、是否只存区域、各矩形块的像素坐标
+    frames.npy        每帧在原录屏中的帧号（int64），时间戳 = 帧号 / fps
+    frames.u8         整帧模式：所有灰度帧依次拼接，形状 (帧数, 高, 宽)
+    roi_<i>.u8        区域模式（--roi）：每个矩形块一个文件，形状 (帧数, 块高, 块宽)
+
+整帧模式产出的灰度图直接是内存映射上的只读视图，不做任何拷贝；
+区域模式只存 config.yaml 的 REGIONS（和校准区域）覆盖的像素：各区域的并集拆成互不重叠的矩形块，
+重叠部分只存一份，回放时把各块贴到一张复用的画布上。
+整帧灰度数据很大（1600x900 每帧约 1.4MB），长录屏建议配合 --sample-interval 或 --roi 使用。
+录屏的解码（decode_frames / prefetch）也在本模块，debug_replay 和 batch_replay 共用。
+
+用法：
+    python frame_store.py recording.mp4                         # 生成 recording.mp4.frames/
+    python frame_store.py recording.mp4 --roi --sample-interval 0.5
+    python debug_replay.py recording.mp4.frames                 # 之后从帧库回放
+"""
+
+import argparse
+import json
+import shutil
+import sys
+from pathlib import Path
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Generator, Iterator, Optional, Union
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from capture import CALIBRATION_REGION, Frame, GrayImage, Rect, region_rect
+from config import REGIONS
+
+_INDEX_FILE = "index.json"
+_FRAMES_FILE = "frames.u8"
+_SOURCE_FRAMES_FILE = "frames.npy"
+_FORMAT_VERSION = 1
+# 相邻两个采样帧之间要跳过的帧数达到此值时改用 seek，否则逐帧 grab（只解封装不解码）
+_SEEK_MIN_SKIP = 90
+# 后台解码线程预先解码好、等待识别的灰度帧数上限
+PREFETCH_FRAMES = 8
+
+
+# ---------------------------------------------------------------------------
+# 解码
+# ---------------------------------------------------------------------------
+
+
+def decode_frames(
+    cap: cv2.VideoCapture, start_frame: int, stop_at: int, step: int
+) -> Iterator[tuple[int, np.ndarray]]:
+    """按采样步长产出 (帧号, 灰度图)。只有需要的帧才解码：
+    中间帧用 grab() 跳过（不做解码和颜色转换），间隔很长时直接 seek 到下一个采样帧。
+    """
+    frame_idx = start_frame
+    while frame_idx < stop_at:
+        ret, frame_bgr = cap.read()
+        if not ret:
+            logger.info("视频读取完毕")
+            return
+        # OpenCV 读出的是 BGR，直接转灰度即可（与正式程序的截图处理等价）
+        yield frame_idx, cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+
+        next_idx = min(frame_idx + step, stop_at)
+        skip = next_idx - frame_idx - 1
+        if skip >= _SEEK_MIN_SKIP:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, next_idx)
+        else:
+            for _ in range(skip):
+                if not cap.grab():
+                    logger.info("视频读取完毕")
+                    return
+        frame_idx = next_idx
+
+
+def prefetch(frames: Iterator, size: int) -> Generator:
+    """在后台线程中迭代 frames，最多预先取出 size 项，使解码与识别并行。
+    生成器被关闭时会等后台线程退出后才返回，调用方在关闭它之后才能释放 frames 依赖的资源（如 VideoCapture）。
+    """
+    items: Queue = Queue(maxsize=size)
+    done = object()  # 结束标记
+    closed = Event()
+    error: list[BaseException] = []
+
+    def put(item: object) -> bool:
+        """放入队列；消费方已结束时放弃并返回 False，不会一直阻塞在满的队列上。"""
+        while not closed.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def worker() -> None:
+        try:
+            for item in frames:
+                if not put(item):
+                    return
+        except BaseException as e:  # 解码线程的异常交给消费方抛出
+            error.append(e)
+        finally:
+            put(done)
+
+    thread = Thread(target=worker, name="decode", daemon=True)
+    thread.start()
+    try:
+        while (item := items.get()) is not done:
+            yield item
+    finally:
+        closed.set()
+        # 后台线程可能正阻塞在 put 上或正在解码，等它退出，之后 frames 不再被访问
+        thread.join()
+    if error:
+        raise error[0]
+
+
+# ---------------------------------------------------------------------------
+# 读取
+# ---------------------------------------------------------------------------
+
+
+def is_frame_store(path: Union[str, Path]) -> bool:
+    """path 是否是 ingest 生成的帧库目录。"""
+    return (Path(path) / _INDEX_FILE).is_file()
+
+
+def _store_rects(window_rect: Rect) -> list[Rect]:
+    """区域模式要保存的矩形块：REGIONS 中的全部区域加上校准用的派生区域，
+    把它们的并集按行切成横条（覆盖的列完全相同的相邻行归为一条），每条中连续的列是一个块，块之间互不重叠。
+    """
+    shape = (window_rect[3] - window_rect[1], window_rect[2] - window_rect[0])
+    mask = np.zeros(shape, dtype=bool)
+    for name in [*REGIONS, CALIBRATION_REGION]:
+        x1, y1, x2, y2 = region_rect(name, window_rect)
+        mask[max(0, y1):y2, max(0, x1):x2] = True
+    rects: list[Rect] = []
+    spans: tuple = ()
+    top = 0
+    for y in range(shape[0] + 1):
+        if y < shape[0]:
+            edges = np.flatnonzero(np.diff(mask[y].astype(np.int8), prepend=0, append=0))
+            row = tuple(zip(edges[::2].tolist(), edges[1::2].tolist()))
+        else:
+            row = ()
+        if row != spans:
+            rects += [(x1, top, x2, y) for x1, x2 in spans]
+            spans, top = row, y
+    return rects
+
+
+class FrameStore:
+    """以内存映射方式读取帧库，产出与 video_frames 相同的 (灰度图, window_rect, 时间)。"""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        with open(self.path / _INDEX_FILE, encoding="utf-8") as f:
+            self.index = json.load(f)
+        if self.index.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"{self.path} 的帧库格式版本不符，请重新生成")
+        self.fps: float = self.index["fps"]
+        self.source: str = self.index["source"]
+        self.window_rect: Rect = (0, 0, self.index["width"], self.index["height"])
+        self.source_frames: np.ndarray = np.load(self.path / _SOURCE_FRAMES_FILE)
+        self.times = self.source_frames / self.fps
+        count = len(self.source_frames)
+        shape = (self.index["height"], self.index["width"])
+        self.rects: list[Rect] = [tuple(rect) for rect in self.index["rects"]]
+        self._frames: Optional[np.memmap] = None
+        self._crops: list[np.memmap] = []
+        self._canvas: Optional[GrayImage] = None
+        if count == 0:
+            return
+        if self.index["roi"]:
+            for i, (x1, y1, x2, y2) in enumerate(self.rects):
+                self._crops.append(
+                    np.memmap(self.path / f"roi_{i}.u8", dtype=np.uint8, mode="r", shape=(count, y2 - y1, x2 - x1))
+                )
+            self._canvas = np.zeros(shape, dtype=np.uint8)
+            # 矩形块在生成帧库时就已确定，之后改过 REGIONS 的话，新区域中超出这些块的部分在回放时是空白
+            if _store_rects(self.window_rect) != self.rects:
+                logger.warning("帧库生成后 REGIONS 已修改，超出原区域的部分在回放中为空白，建议重新生成帧库")
+        else:
+            self._frames = np.memmap(self.path / _FRAMES_FILE, dtype=np.uint8, mode="r", shape=(count, *shape))
+
+    def __len__(self) -> int:
+        return len(self.source_frames)
+
+    def index_of(self, source_frame: int) -> int:
+        """原录屏中第 source_frame 帧（或之后第一帧）在帧库中的序号。"""
+        return int(np.searchsorted(self.source_frames, source_frame))
+
+    def frame(self, index: int) -> Frame:
+        """帧库第 index 帧的 (灰度图, window_rect, 时间)。
+        整帧模式下灰度图是内存映射的只读视图；区域模式下是复用的画布，下一帧会被覆盖。
+        """
+        if self._frames is not None:
+            gray: GrayImage = self._frames[index]
+        else:
+            assert self._canvas is not None
+            for (x1, y1, x2, y2), crops in zip(self.rects, self._crops):
+                self._canvas[y1:y2, x1:x2] = crops[index]
+            gray = self._canvas
+        return gray, self.window_rect, float(self.times[index])
+
+    def frames(self, start_frame: int = 0, end_frame: int = 0, sample_interval: float = 0.0) -> Iterator[Frame]:
+        """产出原录屏帧号在 [start_frame, end_frame) 内的帧；sample_interval > 0 时每隔这么多秒取一帧。"""
+        stop_at = self.index_of(end_frame) if end_frame > 0 else len(self)
+        due = -np.inf
+        for index in range(self.index_of(start_frame), stop_at):
+            if self.times[index] < due:
+                continue
+            due = self.times[index] + sample_interval
+            yield self.frame(index)
+
+    def crops_between(
+        self, previous_time: Optional[float], frame_time: float, region: Rect
+    ) -> Iterator[tuple[float, np.ndarray]]:
+        """时间在 (previous_time, frame_time) 之间的各帧：(时间, region 的小图)。"""
+        if previous_time is None:
+            return
+        x1, y1, x2, y2 = region
+        first = int(np.searchsorted(self.times, previous_time, side="right"))
+        for index in range(first, int(np.searchsorted(self.times, frame_time))):
+            gray, _, t = self.frame(index)
+            yield t, gray[y1:y2, x1:x2]
+
+
+# ---------------------------------------------------------------------------
+# 生成
+# ---------------------------------------------------------------------------
+
+
+def ingest(video: str, output: Optional[str] = None, roi: bool = False, sample_interval: float = 0.0) -> Path:
+    """把录屏解码为帧库，返回帧库目录。sample_interval > 0 时只保存每隔这么多秒的一帧。"""
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        logger.error(f"无法打开视频文件: {video}")
+        sys.exit(1)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    window_rect = (0, 0, w, h)
+    step = max(1, round(sample_interval * fps)) if sample_interval > 0 else 1
+    rects = _store_rects(window_rect) if roi else []
+
+    out = Path(output) if output else Path(f"{video}.frames")
+    out.mkdir(parents=True, exist_ok=True)
+    (out / _INDEX_FILE).unlink(missing_ok=True)  # 覆盖旧帧库时先让它失效
+    frame_bytes = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rects) if roi else w * h
+    estimate = -(-total // step) * frame_bytes
+    free = shutil.disk_usage(out).free
+    logger.info(f"视频信息: {total} 帧, {fps:.1f} fps, 分辨率 {w}x{h}；预计占用 {estimate / 1024 ** 2:.0f} MB")
+    if estimate > free:
+        logger.error(f"磁盘空间不足（剩余 {free / 1024 ** 2:.0f} MB），可以加 --roi 或 --sample-interval 减小帧库")
+        sys.exit(1)
+
+    files = [open(out / f"roi_{i}.u8", "wb") for i in range(len(rects))] if roi else [open(out / _FRAMES_FILE, "wb")]
+    source_frames: list[int] = []
+    decoded = prefetch(decode_frames(cap, 0, total, step), PREFETCH_FRAMES)
+    try:
+        for frame_idx, gray in decoded:
+            if roi:
+                for f, (x1, y1, x2, y2) in zip(files, rects):
+                    f.write(np.ascontiguousarray(gray[y1:y2, x1:x2]).data)
+            else:
+                files[0].write(gray.data)
+            source_frames.append(frame_idx)
+            if len(source_frames) % 500 == 0:
+                logger.info(f"已写入 {len(source_frames)} 帧（第 {frame_idx}/{total} 帧）")
+    finally:
+        for f in files:
+            f.close()
+        decoded.close()  # 等解码线程退出后再释放 cap
+        cap.release()
+
+    np.save(out / _SOURCE_FRAMES_FILE, np.array(source_frames, dtype=np.int64))
+    # index.json 最后写出：中途失败的帧库没有索引，不会被当成完整的帧库读取
+    index = {
+        "version": _FORMAT_VERSION,
+        "source": str(video),
+        "fps": fps,
+        "width": w,
+        "height": h,
+        "roi": roi,
+        "rects": [list(rect) for rect in rects],
+    }
+    with open(out / _INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    size = sum(p.stat().st_size for p in out.iterdir())
+    logger.info(f"帧库已生成: {out}（{len(source_frames)} 帧，{size / 1024 ** 2:.0f} MB）")
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="把录屏预解码为内存映射帧库，供 debug_replay 反复回放")
+    parser.add_argument("video", help="录屏文件路径")
+    parser.add_argument("-o", "--output", metavar="DIR", help="帧库目录（默认为录屏文件名加 .frames）")
+    parser.add_argument("--roi", action="store_true", help="只保存 REGIONS 中的区域，帧库体积小得多")
+    parser.add_argument(
+        "--sample-interval", type=float, default=0.0, metavar="SECONDS", help="每隔多少秒保存一帧（默认逐帧）"
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter={"": "WARNING", "__main__": "INFO"})
+    ingest(args.video, args.output, args.roi, args.sample_interval)
+
+
+if __name__ == "__main__":
+    main()
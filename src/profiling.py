@@ -0,0 +1,138 @@
+"""
+分阶段耗时统计。
+live_frames 和 run() 的每个阶段（找窗口、截图、警告检测、区域换算、变化检测、识别、回调等）用 TIMERS.stage() 包起来，
+各阶段最近若干次的耗时保存在滑动窗口里，按 p50/p95/p99 汇总；缓存命中、跳过的帧等用 TIMERS.count() 计数。
+汇总结果按 config.yaml 的 PROFILING.REPORT_INTERVAL 定期写入日志，也可以随时用热键输出。
+
+默认关闭。关闭时 stage() 直接返回一个什么都不做的共享对象、count() 立即返回，不计时也不加锁。
+"""
+
+from collections import deque
+from threading import Lock
+from time import monotonic, perf_counter
+
+import numpy as np
+from loguru import logger
+
+from config import PROFILING
+
+
+class _NullStage:
+    """计时关闭时 stage() 返回的空上下文管理器（全局只有一个实例）。"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("_timers", "_name", "_start")
+
+    def __init__(self, timers: "StageTimers", name: str) -> None:
+        self._timers = timers
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> "_Stage":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._timers.add(self._name, perf_counter() - self._start)
+        return False
+
+
+class StageTimers:
+    """各阶段耗时的滑动窗口统计和事件计数。后端线程写入，UI 线程（热键）也可以随时读取汇总，内部加锁。"""
+
+    def __init__(self, enabled: bool = False, window: int = 1000, report_interval: float = 60.0) -> None:
+        self.enabled = enabled
+        self._window = window
+        self._report_interval = report_interval
+        self._samples: dict[str, deque[float]] = {}
+        self._counts: dict[str, int] = {}
+        self._lock = Lock()
+        self._last_report = monotonic()
+
+    def stage(self, name: str):
+        """用法：with TIMERS.stage("screenshot"): ...，退出时记录这一段的耗时。"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def snapshot(self) -> dict:
+        """返回 {"stages": {阶段: {n, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}, "counters": {名称: 次数}}。"""
+        with self._lock:
+            samples = {name: np.array(s) for name, s in self._samples.items()}
+            counters = dict(self._counts)
+        stages = {}
+        for name, s in samples.items():
+            p50, p95, p99 = np.percentile(s, [50, 95, 99]) * 1000
+            stages[name] = {
+                "n": len(s),
+                "mean_ms": round(float(s.mean()) * 1000, 3),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(s.max()) * 1000, 3),
+            }
+        return {"stages": stages, "counters": counters}
+
+    def summary(self) -> str:
+        snap = self.snapshot()
+        if not snap["stages"] and not snap["counters"]:
+            return "阶段耗时统计：暂无数据" + ("" if self.enabled else "（计时未开启，见 config.yaml 的 PROFILING.ENABLED）")
+        lines = [f"阶段耗时统计（每个阶段最近 {self._window} 次，单位 ms）："]
+        for name, s in snap["stages"].items():
+            lines.append(
+                f"  {name:<18} n={s['n']:<5} 平均 {s['mean_ms']:>8.3f}  p50 {s['p50_ms']:>8.3f}  "
+                f"p95 {s['p95_ms']:>8.3f}  p99 {s['p99_ms']:>8.3f}  最大 {s['max_ms']:>8.3f}"
+            )
+        if snap["counters"]:
+            lines.append("  计数: " + "，".join(f"{k} {v}" for k, v in snap["counters"].items()))
+        return "\n".join(lines)
+
+    def report(self) -> None:
+        logger.info(self.summary())
+
+    def maybe_report(self) -> None:
+        """距上次输出超过 REPORT_INTERVAL 秒时把汇总写入日志。由 run() 每帧调用一次。"""
+        if not self.enabled or self._report_interval <= 0:
+            return
+        now = monotonic()
+        if now - self._last_report >= self._report_interval:
+            self._last_report = now
+            self.report()
+
+
+# 全局共用的计时器；是否开启、窗口大小和定期输出间隔由 config.yaml 的 PROFILING 决定
+TIMERS = StageTimers(
+    bool(PROFILING.get("ENABLED", False)),
+    int(PROFILING.get("WINDOW", 1000)),
+    float(PROFILING.get("REPORT_INTERVAL", 60.0)),
+)
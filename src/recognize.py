@@ -2,18 +2,36 @@
 卡牌识别模块。负责加载模板并在截图区域内识别牌和标记。
 """
 
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional, TypeVar
 
 import cv2
 import numpy as np
 from loguru import logger
 
-from config import TEMPLATES_DIR, THRESHOLDS
+from config import RECOGNITION, TEMPLATES_DIR, THRESHOLDS, WARNING_CHECK
 from card_types import Card, Mark
+from profiling import TIMERS
 
 # 类型别名
 Image = np.ndarray  # 灰度图，shape (H, W), dtype uint8
 Region = tuple[int, int, int, int]  # (x1, y1, x2, y2) 像素坐标
+RegionKey = TypeVar("RegionKey", bound=Hashable)  # 批量识别时调用方给各区域起的键（区域名等）
+
+# 粗匹配分数比阈值低这么多以上，才直接判定没有警告（缩小后分数会偏低，需要留余量）
+_COARSE_MARGIN = 0.15
+# 缩小后模板短边小于此像素数时粗匹配不可靠，直接全分辨率搜索
+_COARSE_MIN_SIZE = 8
+# 警告检测判断画面变化时的缩略图抽样步长
+_THUMB_STEP = 16
+# 热力图上的候选点不超过此数时 nms_peaks 直接逐点比较（nms_matches），腐蚀/膨胀的固定开销反而更大
+_NMS_LIST_MAX = 128
 
 
 # ---------------------------------------------------------------------------
@@ -63,12 +81,197 @@ def _scale_template(template: Image, scale: float) -> Image:
     return cv2.resize(template, (new_w, new_h), interpolation=interp)
 
 
-def _nms_matches(
+class TemplateBank:
+    """按 scale 缓存缩放后的模板。
+    同一局游戏内 scale 不变，模板只需在校准后缩放一次；
+    用一个小的 LRU 保留最近用过的几种 scale，两局之间窗口大小来回切换时也不必重新缩放。
+    整组牌模板和每种标记模板按需分别构建、各自一个 LRU：只用到警告标记的 scale（如警告粗匹配的 0.5）
+    不会顺带缩放 14 张牌模板，也不会挤掉牌模板的缓存。
+    金字塔匹配的粗匹配模板（scale 的 1/2、1/4）也存在这里，所以容量要比常用 scale 数大几倍。
+    """
+
+    def __init__(self, capacity: int = 8) -> None:
+        self._capacity = capacity
+        # {模板种类: {scale: 缩放后的模板}}，种类为 "cards"（整组牌模板）或标记名
+        self._entries: dict[str, OrderedDict[float, Any]] = {}
+        # 识别可能在多个线程中调用，构建与淘汰需要加锁
+        self._lock = Lock()
+
+    def _get(self, kind: str, scale: float, build: Callable[[], Any]) -> Any:
+        """返回 kind 类模板在指定 scale 下的缩放结果，不存在时调用 build 构建。"""
+        key = round(scale, 4)
+        with self._lock:
+            entries = self._entries.setdefault(kind, OrderedDict())
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                return entry
+            entry = build()
+            entries[key] = entry
+            if len(entries) > self._capacity:
+                evicted, _ = entries.popitem(last=False)
+                logger.debug(f"{kind} 缩放模板缓存已满，淘汰 scale={evicted}")
+            logger.debug(f"已构建 scale={key} 的 {kind} 缩放模板")
+            return entry
+
+    def cards(self, scale: float) -> dict[Card, Image]:
+        return self._get(
+            "cards", scale, lambda: {card: _scale_template(t, scale) for card, t in CARD_TEMPLATES.items()}
+        )
+
+    def mark(self, mark: Mark, scale: float) -> Optional[Image]:
+        template = MARK_TEMPLATES.get(mark)
+        if template is None:
+            return None
+        return self._get(mark.value, scale, lambda: _scale_template(template, scale))
+
+
+# 所有识别接口共用的缩放模板缓存；tracker 在 calibrate_scale 得出新 scale 后预先构建该 scale 的牌模板
+TEMPLATE_BANK = TemplateBank()
+
+
+class ResultCache:
+    """以区域裁剪图内容为键的识别结果 LRU 缓存。
+    同一手牌会在屏幕上停留好几秒，底牌展示也会反复出现，内容完全相同的裁剪图不必重复识别。
+    键 = 裁剪图字节的哈希 + 尺寸 + scale + 影响结果的阈值和识别选项，
+    所以所有区域（三个出牌区、底牌区、手牌区）共用一个缓存，选项改变后旧结果也不会被误用。
+    缓存的值只是很小的字典或浮点数，容量按条数限制即可控制内存。
+    """
+
+    def __init__(self, capacity: int = 256) -> None:
+        self._capacity = capacity
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, crop: Image, *params: Hashable) -> tuple:
+        # 用 blake2b 而不是内置 hash()：后者每个进程的种子不同，无法随 save/load 跨进程复用
+        digest = hashlib.blake2b(np.ascontiguousarray(crop).data, digest_size=16).digest()
+        return (kind, digest, crop.shape, *params)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        if self._capacity <= 0:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        TIMERS.count("result_cache_hit" if value is not None else "result_cache_miss")
+        return value
+
+    def put(self, key: tuple, value: Any) -> None:
+        if self._capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"识别缓存: 命中 {self.hits} 次，未命中 {self.misses} 次（命中率 {rate:.1%}），共 {len(self._entries)} 条"
+
+    def save(self, path: Path) -> None:
+        """把缓存内容写入 JSON 文件。debug_replay 换不同选项重复回放同一段录屏时可以直接复用。
+        只写摘要（十六进制）、尺寸、参数和识别结果这些纯数据，不用 pickle，载入别人给的文件也不会执行代码。
+        """
+        with self._lock:
+            entries = [_encode_cache_entry(key, value) for key, value in self._entries.items()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": _CACHE_FILE_VERSION, "entries": entries}, f, ensure_ascii=False)
+        logger.info(f"识别缓存已保存到 {path}（{len(entries)} 条）")
+
+    def load(self, path: Path) -> None:
+        """从 save 写出的文件恢复缓存；文件不存在时什么都不做。
+        文件不是这个格式时抛出 ValueError；格式不对的单条记录跳过并在日志中报告条数。
+        """
+        if not Path(path).exists():
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"{path} 不是识别缓存文件: {e}") from e
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != _CACHE_FILE_VERSION
+            or not isinstance(data.get("entries"), list)
+        ):
+            raise ValueError(f"{path} 不是识别缓存文件或版本不符（需要版本 {_CACHE_FILE_VERSION}）")
+        loaded = 0
+        for entry in data["entries"]:
+            decoded = _decode_cache_entry(entry)
+            if decoded is not None:
+                self.put(*decoded)
+                loaded += 1
+        skipped = len(data["entries"]) - loaded
+        if skipped:
+            logger.warning(f"{path} 中有 {skipped} 条缓存记录格式不对，已跳过")
+        logger.info(f"已从 {path} 载入识别缓存（{loaded} 条）")
+
+
+# 识别缓存文件的格式版本，键或值的结构改变时加一，旧文件会被拒绝
+_CACHE_FILE_VERSION = 1
+_CARD_VALUES = {card.value: card for card in Card}
+
+
+def _encode_cache_entry(key: tuple, value: Any) -> dict[str, Any]:
+    kind, digest, shape, *params = key
+    if kind == "cards":
+        value = {card.value: count for card, count in value.items()}
+    return {"kind": kind, "digest": digest.hex(), "shape": list(shape), "params": params, "value": value}
+
+
+def _decode_cache_entry(entry: Any) -> Optional[tuple[tuple, Any]]:
+    """把缓存文件中的一条记录还原成 (键, 值)；任何字段的类型或取值不对都返回 None。"""
+    if not isinstance(entry, dict):
+        return None
+    kind, digest, shape, params, value = (entry.get(k) for k in ("kind", "digest", "shape", "params", "value"))
+    if not isinstance(digest, str) or len(digest) != 32:
+        return None
+    try:
+        digest_bytes = bytes.fromhex(digest)
+    except ValueError:
+        return None
+    if not isinstance(shape, list) or not shape or not all(type(n) is int and n >= 0 for n in shape):
+        return None
+    if not isinstance(params, list) or not all(type(p) in (str, int, float) for p in params):
+        return None
+    if kind == "cards":
+        if not isinstance(value, dict) or not all(
+            k in _CARD_VALUES and type(n) is int and n > 0 for k, n in value.items()
+        ):
+            return None
+        value = {_CARD_VALUES[k]: n for k, n in value.items()}
+    elif kind == "mark":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        value = float(value)
+    else:
+        return None
+    return (kind, digest_bytes, tuple(shape), *params), value
+
+
+# 所有识别接口共用的结果缓存；容量由 config.yaml 的 RECOGNITION.CACHE_SIZE 决定，0 表示关闭
+RESULT_CACHE = ResultCache(int(RECOGNITION.get("CACHE_SIZE", 256)))
+
+
+def nms_matches(
     matches: list[tuple[float, tuple[int, int]]], min_dist: int
 ) -> list[tuple[float, tuple[int, int]]]:
     """非极大值抑制（NMS）：对距离小于 min_dist 的匹配点，只保留置信度最高的那个。
     模板匹配的结果是一张热力图，同一张牌周围相邻几个像素都会有高置信度，
     不做 NMS 的话一张牌会被计数多次。
+    候选点已经是一个列表时使用（如 segment 引擎逐部件确认出的位置），逐点比较，O(n²)，候选点多时很慢。
+    matches 按热力图行优先顺序给出时，结果与 nms_peaks 完全相同（同分的点先出现的优先）；
+    从热力图取候选点的场合应直接用 nms_peaks。
     """
     if not matches:
         return []
@@ -85,46 +288,307 @@ def _nms_matches(
     return kept
 
 
+def nms_peaks(
+    res: np.ndarray, threshold: float, min_dist: int
+) -> list[tuple[float, tuple[int, int]]]:
+    """在热力图上直接做 NMS，结果与 nms_matches 完全相同，按置信度从高到低返回。
+    nms_matches 的贪心规则是：按置信度从高到低，离已保留点不够远的点丢弃。
+    等价地，一个候选点如果在它周围 (2*min_dist-1)² 的方框内排名最靠前，它一定会被保留，
+    同时它方框内的其他候选点一定会被丢弃。于是每一轮用腐蚀（方框内取最小排名）一次性找出
+    所有这样的点，再用膨胀删掉它们方框内的候选点，重复直到没有候选点，
+    轮数通常只有个位数，模糊画面上成千上万个候选点也不再需要逐对比较。
+    候选点很少（清晰画面上的常见情况）时直接交给 nms_matches。
+    """
+    ys, xs = np.nonzero(res >= threshold)  # 行优先顺序，与 np.where 一致
+    if len(ys) == 0:
+        return []
+    if len(ys) <= _NMS_LIST_MAX:
+        return nms_matches([(float(res[y, x]), (int(x), int(y))) for y, x in zip(ys, xs)], min_dist)
+
+    # 只在候选点的外接矩形内计算，稀疏热力图上可以省掉大部分像素
+    y0, x0 = ys.min(), xs.min()
+    ys, xs = ys - y0, xs - x0
+    shape = (int(ys.max()) + 1, int(xs.max()) + 1)
+
+    # 排名：置信度从高到低，相同置信度按原始顺序（与 sorted(reverse=True) 的稳定排序一致）
+    conf = res[ys + y0, xs + x0]
+    order = np.argsort(-conf, kind="stable")
+    rank = np.empty(len(order), dtype=np.float32)
+    rank[order] = np.arange(len(order), dtype=np.float32)
+    rank_map = np.full(shape, np.inf, dtype=np.float32)
+    rank_map[ys, xs] = rank
+
+    kernel = np.ones((2 * min_dist - 1, 2 * min_dist - 1), dtype=np.uint8)
+    kept_y: list[np.ndarray] = []
+    kept_x: list[np.ndarray] = []
+    kept_rank: list[np.ndarray] = []
+    while True:
+        # 腐蚀 = 方框内取最小值；越界部分按 +inf 处理，不影响结果
+        local_best = cv2.erode(rank_map, kernel)
+        winners = (rank_map == local_best) & np.isfinite(rank_map)
+        wy, wx = np.nonzero(winners)
+        if len(wy) == 0:
+            break
+        kept_y.append(wy)
+        kept_x.append(wx)
+        kept_rank.append(rank_map[wy, wx])
+        suppressed = cv2.dilate(winners.view(np.uint8), kernel).view(bool)
+        rank_map[suppressed] = np.inf
+
+    ky = np.concatenate(kept_y)
+    kx = np.concatenate(kept_x)
+    by_rank = np.argsort(np.concatenate(kept_rank))
+    return [
+        (float(res[y + y0, x + x0]), (int(x + x0), int(y + y0)))
+        for y, x in zip(ky[by_rank], kx[by_rank])
+    ]
+
+
+def _pyramid_factor(templates: list[Image]) -> float:
+    """根据 RECOGNITION.PYRAMID_LEVELS 决定粗匹配的缩小比例（0.5 ** 层数）。
+    缩小后最小的模板短边不足 _COARSE_MIN_SIZE 像素时粗匹配不可靠，自动减少层数；
+    减到 0 层（返回 1.0）即不做粗匹配，直接全分辨率搜索。
+    所以 scale 越大（高 DPI 窗口），能用的层数越多，省下的计算量也越多。
+    """
+    levels = int(RECOGNITION.get("PYRAMID_LEVELS", 0))
+    if levels <= 0 or not templates:
+        return 1.0
+    min_side = min(min(t.shape[:2]) for t in templates)
+    for level in range(levels, 0, -1):
+        factor = 0.5 ** level
+        if min_side * factor >= _COARSE_MIN_SIZE:
+            return factor
+    return 1.0
+
+
+def _pyramid_res(
+    crop: Image, small: Image, t: Image, coarse_t: Image, factor: float, coarse_threshold: float
+) -> np.ndarray:
+    """金字塔模式下的热力图：先在缩小图上粗匹配，只在粗匹配分数达到 coarse_threshold 的位置附近
+    做全分辨率匹配，其余位置填 -1（低于任何阈值）。
+    返回与全分辨率 matchTemplate 等大的热力图，候选邻域内的数值与全分辨率完全相同，
+    因此后续的阈值判断和 NMS 不需要任何改动。
+    """
+    th, tw = t.shape[:2]
+    res = np.full((crop.shape[0] - th + 1, crop.shape[1] - tw + 1), -1.0, dtype=np.float32)
+    if coarse_t.shape[0] > small.shape[0] or coarse_t.shape[1] > small.shape[1]:
+        return res
+    coarse = cv2.matchTemplate(small, coarse_t, cv2.TM_CCOEFF_NORMED)
+    mask = (coarse >= coarse_threshold).view(np.uint8)
+    num, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    # 粗匹配坐标映射回原分辨率，四周留出缩放取整造成的误差
+    pad = int(np.ceil(1 / factor)) + 1
+    for i in range(1, num):
+        cx, cy, cw, ch = (int(v) for v in stats[i][:4])
+        x1 = max(0, round(cx / factor) - pad)
+        y1 = max(0, round(cy / factor) - pad)
+        x2 = min(res.shape[1], round((cx + cw - 1) / factor) + pad + 1)
+        y2 = min(res.shape[0], round((cy + ch - 1) / factor) + pad + 1)
+        if x1 >= x2 or y1 >= y2:
+            continue
+        window = crop[y1:y2 + th - 1, x1:x2 + tw - 1]
+        res[y1:y2, x1:x2] = cv2.matchTemplate(window, t, cv2.TM_CCOEFF_NORMED)
+    return res
+
+
 # ---------------------------------------------------------------------------
 # 公开接口
 # ---------------------------------------------------------------------------
 
 
-def has_warning(image: Image, scale: float = 1.0) -> bool:
-    """检测画面中是否出现警告弹窗标记。在整张截图上搜索，不限定区域。"""
-    template = MARK_TEMPLATES.get(Mark.WARNING)
-    t = _scale_template(template, scale)
-    if t.shape[0] > image.shape[0] or t.shape[1] > image.shape[1]:
+def has_warning(image: Image, scale: float = 1.0, region: Optional[Region] = None) -> bool:
+    """检测画面中是否出现警告弹窗标记。region 为 None 时在整张截图上搜索。
+    先在缩小后的画面上粗匹配找出最可能的位置，再只在该位置附近做全分辨率确认，
+    粗匹配分数远低于阈值时直接返回 False。
+    """
+    crop = _crop(image, region) if region is not None else image
+    t = TEMPLATE_BANK.mark(Mark.WARNING, scale)
+    if t is None:
+        return False
+    if t.shape[0] > crop.shape[0] or t.shape[1] > crop.shape[1]:
         return False
-    res = cv2.matchTemplate(image, t, cv2.TM_CCOEFF_NORMED)
+    threshold = THRESHOLDS.get("warning", 0.9)
+
+    factor = WARNING_CHECK.get("DOWNSCALE", 1.0)
+    coarse_t = TEMPLATE_BANK.mark(Mark.WARNING, scale * factor) if factor < 1.0 else None
+    if coarse_t is not None and min(coarse_t.shape) >= _COARSE_MIN_SIZE:
+        small = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        if coarse_t.shape[0] > small.shape[0] or coarse_t.shape[1] > small.shape[1]:
+            return False
+        res = cv2.matchTemplate(small, coarse_t, cv2.TM_CCOEFF_NORMED)
+        _, coarse_val, _, (cx, cy) = cv2.minMaxLoc(res)
+        if coarse_val < threshold - _COARSE_MARGIN:
+            return False
+        # 粗匹配坐标映射回原分辨率，四周留出缩放取整造成的误差
+        pad = int(np.ceil(1 / factor)) + 1
+        x1 = max(0, round(cx / factor) - pad)
+        y1 = max(0, round(cy / factor) - pad)
+        crop = crop[y1:y1 + t.shape[0] + 2 * pad, x1:x1 + t.shape[1] + 2 * pad]
+        if t.shape[0] > crop.shape[0] or t.shape[1] > crop.shape[1]:
+            return False
+
+    res = cv2.matchTemplate(crop, t, cv2.TM_CCOEFF_NORMED)
     _, max_val, _, _ = cv2.minMaxLoc(res)
-    detected = max_val >= THRESHOLDS.get("warning", 0.9)
+    detected = max_val >= threshold
     if detected:
         logger.debug(f"检测到警告弹窗（置信度 {max_val:.3f}），跳过当前帧")
     return detected
 
 
+class WarningDetector:
+    """按自己的节奏检测警告弹窗，而不是每帧都做一次模板匹配。
+    每隔 INTERVAL 帧强制检测一次；弹窗区域（或调用方给出的探测区域）的缩略图与上次检测时相比变化明显时立即检测；
+    其余帧直接沿用上次的结果。
+    只截取区域的实时截图每帧只截探测区域，需要检测时才通过 refresh 回调截取整个弹窗区域。
+    """
+
+    def __init__(self) -> None:
+        self._interval = max(1, int(WARNING_CHECK.get("INTERVAL", 1)))
+        self._diff_threshold = float(WARNING_CHECK.get("DIFF_THRESHOLD", 0.0))
+        self._frames_since_check = 0
+        self._last_thumb: Optional[Image] = None
+        self._last_result = False
+
+    def check(
+        self,
+        image: Image,
+        region: Optional[Region] = None,
+        probe: Optional[Region] = None,
+        refresh: Optional[Callable[[], Any]] = None,
+    ) -> bool:
+        """probe 为 None 时用整个弹窗区域判断变化；refresh 在模板匹配之前调用，用于补截 image 上的弹窗区域。"""
+        # 对探测区域隔行隔列抽样得到缩略图，几乎没有开销，只用于判断画面是否有明显变化
+        watched = probe if probe is not None else region
+        area = _crop(image, watched) if watched is not None else image
+        thumb = np.ascontiguousarray(area[::_THUMB_STEP, ::_THUMB_STEP])
+        self._frames_since_check += 1
+        changed = (
+            self._last_thumb is None
+            or self._last_thumb.shape != thumb.shape
+            or float(cv2.absdiff(thumb, self._last_thumb).mean()) > self._diff_threshold
+        )
+        if not changed and self._frames_since_check < self._interval:
+            return self._last_result
+
+        if refresh is not None:
+            refresh()
+        self._last_result = has_warning(image, 1.0, region)
+        self._last_thumb = thumb
+        self._frames_since_check = 0
+        return self._last_result
+
+
+class ChangeGate:
+    """判断各区域自上次识别以来是否发生变化，未变化的区域可以直接复用上次的识别结果。
+    signature 模式把区域按 GATE_BLOCK 分块求平均灰度作为签名，任一块的变化超过 GATE_THRESHOLD 才算变化：
+    分块平均抹平了压缩噪声和微小的闪烁，而一张牌的出现、消失或点数改变会集中改变几个块，不会被平均稀释。
+    对比的基准是该区域上次识别时的签名而不是上一帧，缓慢的累积变化最终也会被发现。
+    但窗口较小时一个块里的字形笔画很少，点数相近的两张牌块差异可能不超过阈值，所以默认仍用 exact。
+    exact 模式要求像素与上次识别时完全相同。
+    两种模式都只和同一区域的上一次比较；判为变化的区域还会在 identify_cards 中查 RESULT_CACHE，
+    不同区域、不相邻帧之间内容完全相同的情况由缓存复用结果。
+    """
+
+    def __init__(self) -> None:
+        self._mode = RECOGNITION.get("CHANGE_GATE", "exact")
+        self._block = max(1, int(RECOGNITION.get("GATE_BLOCK", 8)))
+        self._threshold = float(RECOGNITION.get("GATE_THRESHOLD", 0.0))
+        self._refs: dict[Hashable, Image] = {}
+
+    def _signature(self, crop: Image) -> Image:
+        if self._mode != "signature":
+            # 帧来源可能复用同一块缓冲区（见 capture.CaptureSession），保存时必须 copy
+            return crop.copy()
+        h, w = crop.shape[:2]
+        size = (max(1, w // self._block), max(1, h // self._block))
+        return cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+
+    def changed(self, key: Hashable, crop: Image) -> bool:
+        """区域 key 的内容与上次识别时相比是否有变化；有变化时把当前内容记为新的基准。"""
+        sig = self._signature(crop)
+        ref = self._refs.get(key)
+        if ref is not None and ref.shape == sig.shape:
+            if self._mode != "signature":
+                if np.array_equal(sig, ref):
+                    logger.debug(f"{key} 区域像素未变，跳过识别")
+                    return False
+            else:
+                diff = float(cv2.absdiff(sig, ref).max())
+                if diff <= self._threshold:
+                    logger.debug(f"{key} 区域像素未变（最大块差异 {diff:.1f}），跳过识别")
+                    return False
+                logger.debug(f"{key} 区域发生变化（最大块差异 {diff:.1f}），重新识别")
+        self._refs[key] = sig
+        return True
+
+
 def identify_cards(image: Image, region: Region, scale: float = 1.0) -> dict[Card, int]:
     """在截图的指定区域内识别所有卡牌，返回 {Card: 数量} 字典。
     scale 为模板缩放比例（窗口实际高度 / 参考高度），用于适配不同分辨率。
+    具体使用哪种识别引擎由 config.yaml 的 RECOGNITION.ENGINE 决定：
+    template（默认）逐一滑动 14 张模板；segment 先分割字形再分类（见 segment.py）。
+    内容完全相同的区域直接返回 RESULT_CACHE 中的结果。
     """
     crop = _crop(image, region)
+    key = _cards_key(crop, scale)
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        logger.debug(f"区域 {region} 命中识别缓存，像素未变，复用识别结果")
+        return dict(cached)
+    result = _identify_cards_crop(crop, scale)
+    RESULT_CACHE.put(key, result)
+    return dict(result)
+
+
+def _cards_key(crop: Image, scale: float) -> tuple:
+    """牌面识别结果的缓存键：除裁剪图内容外，还包含所有会影响识别结果的参数。"""
+    return RESULT_CACHE.key(
+        "cards",
+        crop,
+        round(scale, 4),
+        THRESHOLDS["card"],
+        RECOGNITION.get("ENGINE", "template"),
+        int(RECOGNITION.get("PYRAMID_LEVELS", 0)),
+    )
+
+
+def _identify_cards_crop(crop: Image, scale: float) -> dict[Card, int]:
+    if RECOGNITION.get("ENGINE", "template") == "segment":
+        import segment  # segment 依赖本模块的模板缓存，延迟导入避免循环引用
+
+        return segment.identify_cards(crop, scale)
+    return _identify_cards_template(crop, scale)
+
+
+def _identify_cards_template(crop: Image, scale: float) -> dict[Card, int]:
+    """模板扫描引擎：每张牌模板在整个区域上滑动匹配一次，再做 NMS 计数。
+    RECOGNITION.PYRAMID_LEVELS > 0 时先在缩小图上粗匹配，只在候选位置附近做全分辨率确认（见 _pyramid_res）。
+    """
     threshold = THRESHOLDS["card"]
     results: dict[Card, int] = {}
+    templates = TEMPLATE_BANK.cards(scale)
 
-    for card, template in CARD_TEMPLATES.items():
-        t = _scale_template(template, scale)
+    factor = _pyramid_factor(list(templates.values()))
+    small, coarse_templates = crop, templates  # 不做金字塔匹配时不会用到
+    if factor < 1.0:
+        small = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        coarse_templates = TEMPLATE_BANK.cards(scale * factor)
+
+    for card, t in templates.items():
         if t.shape[0] > crop.shape[0] or t.shape[1] > crop.shape[1]:
             continue  # 模板比截图区域还大，无法匹配，跳过
 
         # matchTemplate 返回一张与截图等大的热力图，每个像素值是该位置的匹配置信度
-        res = cv2.matchTemplate(crop, t, cv2.TM_CCOEFF_NORMED)
-        locs = np.where(res >= threshold)
-        raw_matches = [(float(res[y, x]), (x, y)) for x, y in zip(*locs[::-1])]
+        if factor < 1.0:
+            res = _pyramid_res(
+                crop, small, t, coarse_templates[card], factor, threshold - _COARSE_MARGIN
+            )
+        else:
+            res = cv2.matchTemplate(crop, t, cv2.TM_CCOEFF_NORMED)
 
         # NMS 的最小距离设为模板宽度的一半，确保同一张牌只被计数一次
         min_dist = max(t.shape[1] // 2, 5)
-        kept = _nms_matches(raw_matches, min_dist)
+        kept = nms_peaks(res, threshold, min_dist)
 
         if kept:
             results[card] = len(kept)
@@ -135,20 +599,184 @@ def identify_cards(image: Image, region: Region, scale: float = 1.0) -> dict[Car
     return results
 
 
+def _pack_mosaic(
+    shapes: dict[RegionKey, tuple[int, int]]
+) -> tuple[dict[RegionKey, tuple[int, int]], tuple[int, int]]:
+    """货架式排布拼图：区域按高度从高到低依次放进第一个还放得下的货架（一行），
+    放不下就新开一个货架。尝试几种拼图宽度，取总面积最小的方案，尽量减少无用的填充像素。
+    返回 ({区域键: (x, y) 偏移}, 拼图 (高, 宽))。
+    """
+    order = sorted(shapes, key=lambda k: shapes[k][0], reverse=True)
+    max_w = max(w for _, w in shapes.values())
+    best: Optional[tuple[int, dict, tuple[int, int]]] = None
+    for width in sorted({max_w} | {max_w + w for _, w in shapes.values()}):
+        shelves: list[list[int]] = []  # 每个货架：[y, 已用宽度]
+        offsets: dict[RegionKey, tuple[int, int]] = {}
+        height = 0
+        for key in order:
+            h, w = shapes[key]
+            for shelf in shelves:
+                if shelf[1] + w <= width:
+                    offsets[key] = (shelf[1], shelf[0])
+                    shelf[1] += w
+                    break
+            else:
+                # 按高度降序放置，货架的第一个区域就是最高的，货架高度即其高度
+                shelves.append([height, w])
+                offsets[key] = (0, height)
+                height += h
+        used_w = max(shelf[1] for shelf in shelves)
+        if best is None or used_w * height < best[0]:
+            best = (used_w * height, offsets, (height, used_w))
+    assert best is not None
+    return best[1], best[2]
+
+
+# parallel 模式的线程池，第一次使用时创建
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+# 创建线程池之前 OpenCV 的线程数，shutdown_parallel 时恢复
+_cv_threads_before_executor = 0
+
+
+def _parallel_executor() -> ThreadPoolExecutor:
+    """返回 parallel 模式共用的线程池。创建时同时调低 OpenCV 自身的线程数（进程级设置，只设一次）：
+    每个区域已经占了一个线程，OpenCV 内部再按全部核数开线程会导致线程数远超核数，反而变慢。
+    线程池存在期间其他识别也按这个线程数运行，shutdown_parallel 关闭线程池时恢复原值。
+    """
+    global _executor, _cv_threads_before_executor
+    with _executor_lock:
+        if _executor is None:
+            cpus = os.cpu_count() or 1
+            workers = int(RECOGNITION.get("WORKERS", 0)) or min(4, cpus)
+            cv_threads = max(1, cpus // workers)
+            _cv_threads_before_executor = cv2.getNumThreads()
+            cv2.setNumThreads(cv_threads)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recognize")
+            logger.debug(f"并行识别线程池: {workers} 个线程，OpenCV 每线程 {cv_threads} 个线程")
+        return _executor
+
+
+def shutdown_parallel() -> None:
+    """关闭 parallel 模式的线程池并恢复 OpenCV 原来的线程数；没有创建过线程池时什么都不做。
+    之后再以 parallel 模式识别会重新创建。由 Tracker 在后端线程退出时调用。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            return
+        _executor.shutdown()
+        _executor = None
+        cv2.setNumThreads(_cv_threads_before_executor)
+
+
+def identify_cards_batch(
+    image: Image, regions: dict[RegionKey, Region], scale: float = 1.0
+) -> dict[RegionKey, dict[Card, int]]:
+    """一次识别同一帧里的多个区域，返回 {区域键: {Card: 数量}}，结果与逐个调用 identify_cards 相同。
+    RECOGNITION.BATCH 为 parallel 时各区域在线程池中并行识别，结果按 regions 的顺序收集，与串行完全一致。
+    RECOGNITION.BATCH 为 mosaic 且使用模板扫描引擎时，把各区域裁剪图拼成一张紧凑的拼图（见 _pack_mosaic），
+    每张模板只对拼图做一次 matchTemplate，减少调用次数，也让每次 OpenCV 调用处理更多像素。
+    拼图不需要额外的间隔：对每个区域只取"模板窗口完全落在该区域内"的那部分热力图，
+    跨越两个区域边界的窗口位置直接丢弃，因此不会出现跨区域的误匹配。
+    """
+    if not regions:
+        return {}
+    if RECOGNITION.get("BATCH", "serial") == "parallel" and len(regions) > 1:
+        keys = list(regions)
+        executor = _parallel_executor()
+        return dict(zip(keys, executor.map(lambda key: identify_cards(image, regions[key], scale), keys)))
+    use_mosaic = (
+        RECOGNITION.get("BATCH", "serial") == "mosaic"
+        and RECOGNITION.get("ENGINE", "template") == "template"
+        and int(RECOGNITION.get("PYRAMID_LEVELS", 0)) <= 0  # 金字塔模式已经只匹配候选邻域，拼图无益
+        and len(regions) > 1
+    )
+    if not use_mosaic:
+        return {key: identify_cards(image, region, scale) for key, region in regions.items()}
+
+    # 先查结果缓存，只有未命中的区域才拼进拼图
+    results: dict[RegionKey, dict[Card, int]] = {}
+    crops: dict[RegionKey, Image] = {}
+    cache_keys: dict[RegionKey, tuple] = {}
+    for key, region in regions.items():
+        crop = _crop(image, region)
+        cache_keys[key] = _cards_key(crop, scale)
+        cached = RESULT_CACHE.get(cache_keys[key])
+        if cached is not None:
+            logger.debug(f"[{key}] 命中识别缓存，像素未变，复用识别结果")
+            results[key] = dict(cached)
+        else:
+            crops[key] = crop
+    if len(crops) <= 1:
+        for key, crop in crops.items():
+            results[key] = _identify_cards_crop(crop, scale)
+            RESULT_CACHE.put(cache_keys[key], dict(results[key]))
+        return results
+
+    offsets, shape = _pack_mosaic({key: c.shape for key, c in crops.items()})
+    mosaic = np.zeros(shape, dtype=np.uint8)
+    for key, c in crops.items():
+        ox, oy = offsets[key]
+        mosaic[oy:oy + c.shape[0], ox:ox + c.shape[1]] = c
+
+    threshold = THRESHOLDS["card"]
+    results.update({key: {} for key in crops})
+    for card, t in TEMPLATE_BANK.cards(scale).items():
+        th, tw = t.shape
+        fits = [key for key, c in crops.items() if th <= c.shape[0] and tw <= c.shape[1]]
+        if not fits:
+            continue  # 模板比所有区域都大，无法匹配，跳过
+        res = cv2.matchTemplate(mosaic, t, cv2.TM_CCOEFF_NORMED)
+        min_dist = max(tw // 2, 5)
+        for key in fits:
+            h, w = crops[key].shape
+            ox, oy = offsets[key]
+            # 该区域内合法的窗口左上角：行 [oy, oy + h - th]，列 [ox, ox + w - tw]
+            sub = res[oy:oy + h - th + 1, ox:ox + w - tw + 1]
+            kept = nms_peaks(sub, threshold, min_dist)
+            if kept:
+                results[key][card] = len(kept)
+                logger.debug(
+                    f"[{key}] 识别到 {len(kept)} 张 {card.value}（置信度最高: {kept[0][0]:.3f}）"
+                )
+    for key in crops:
+        RESULT_CACHE.put(cache_keys[key], dict(results[key]))
+    return results
+
+
 def match_mark(image: Image, region: Region, mark: Mark, scale: float = 1.0) -> float:
     """在指定区域内匹配特定标记（地主皇冠、PASS 文字等），返回最高置信度。
     与 identify_cards 不同，标记只需要判断"有没有"，不需要计数，所以直接返回最高分。
+    金字塔模式下先在缩小图上找出最可能的位置，再只在该位置附近做全分辨率匹配。
     """
     crop = _crop(image, region)
-    template = MARK_TEMPLATES.get(mark)
-    if template is None:
+    t = TEMPLATE_BANK.mark(mark, scale)
+    if t is None:
         return 0.0
 
-    t = _scale_template(template, scale)
     if t.shape[0] > crop.shape[0] or t.shape[1] > crop.shape[1]:
         return 0.0
 
+    key = RESULT_CACHE.key("mark", crop, mark.value, round(scale, 4), int(RECOGNITION.get("PYRAMID_LEVELS", 0)))
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    factor = _pyramid_factor([t])
+    coarse_t = TEMPLATE_BANK.mark(mark, scale * factor) if factor < 1.0 else None
+    if coarse_t is not None:
+        small = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        if coarse_t.shape[0] <= small.shape[0] and coarse_t.shape[1] <= small.shape[1]:
+            coarse = cv2.matchTemplate(small, coarse_t, cv2.TM_CCOEFF_NORMED)
+            _, _, _, (cx, cy) = cv2.minMaxLoc(coarse)
+            pad = int(np.ceil(1 / factor)) + 1
+            x1 = max(0, round(cx / factor) - pad)
+            y1 = max(0, round(cy / factor) - pad)
+            crop = crop[y1:y1 + t.shape[0] + 2 * pad, x1:x1 + t.shape[1] + 2 * pad]
+
     res = cv2.matchTemplate(crop, t, cv2.TM_CCOEFF_NORMED)
     _, max_val, _, _ = cv2.minMaxLoc(res)
     logger.debug(f"{mark.value} 置信度: {max_val:.3f}")
+    RESULT_CACHE.put(key, float(max_val))
     return float(max_val)
@@ -0,0 +1,291 @@
+"""
+对局录制与读取。
+实时模式下只记录 run() 实际查看过的区域：每帧按 RegionPlan 当前声明的区域裁出小图，连同时间戳和窗口位置
+交给后台写盘线程，每 CHUNK_FRAMES 帧用 np.savez_compressed 写成一个分块文件。
+同一分块内与上一帧完全相同的区域只存一份像素（等待、思考期间的画面几乎都不变），
+所有会话合计超过 MAX_MB 时从最旧的分块开始删除。
+
+分块文件（chunk_XXXXXX.npz）的内容：
+    times   float64 (n,)    每帧的时间戳（截图时的 monotonic()）
+    rects   int32   (n, 4)  每帧的 window_rect
+    names   str     (k,)    本分块出现过的区域名
+    crops   int32   (m, 6)  每个区域小图：(帧序号, 区域名序号, x1, y1, x2, y2)，坐标为截图内的像素坐标
+    offsets int64   (m,)    每个小图在 pixels 中的起始位置（内容重复的小图指向同一位置）
+    pixels  uint8   (p,)    所有小图的像素依次拼接
+
+Recording 按帧号读取会话目录，产出与 live_frames 相同格式的帧，供 debug_replay 回放。
+"""
+
+from collections import deque
+from pathlib import Path
+from queue import Full, Queue
+from threading import Thread
+from time import strftime
+from typing import Iterator, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from capture import Frame, GrayImage, Rect, RegionPlan, region_rect
+from config import RECORDING, RECORDINGS_DIR
+from profiling import TIMERS
+
+_CHUNK_GLOB = "chunk_*.npz"
+_STOP = object()  # 写盘线程的结束标记
+
+
+# ---------------------------------------------------------------------------
+# 录制
+# ---------------------------------------------------------------------------
+
+
+class _ChunkBuilder:
+    """在写盘线程中累积一个分块的内容。"""
+
+    def __init__(self) -> None:
+        self.times: list[float] = []
+        self.rects: list[Rect] = []
+        self.names: dict[str, int] = {}
+        self.crops: list[tuple[int, int, int, int, int, int]] = []
+        self.offsets: list[int] = []
+        self.pixels: list[np.ndarray] = []
+        self.size = 0
+        self._last: dict[str, tuple[Rect, np.ndarray, int]] = {}  # 区域名 → 上一次存下的 (坐标, 像素, 位置)
+
+    def add(self, timestamp: float, window_rect: Rect, crops: dict[str, tuple[Rect, np.ndarray]]) -> None:
+        index = len(self.times)
+        self.times.append(timestamp)
+        self.rects.append(window_rect)
+        for name, (rect, crop) in crops.items():
+            name_id = self.names.setdefault(name, len(self.names))
+            last = self._last.get(name)
+            if last is not None and last[0] == rect and np.array_equal(last[1], crop):
+                offset = last[2]
+            else:
+                offset = self.size
+                self.pixels.append(crop.ravel())
+                self.size += crop.size
+                self._last[name] = (rect, crop, offset)
+            self.crops.append((index, name_id, *rect))
+            self.offsets.append(offset)
+
+    def save(self, path: Path) -> None:
+        # 先写临时文件再改名，被删除或中途退出时不会留下读不出来的半个分块
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                times=np.array(self.times, dtype=np.float64),
+                rects=np.array(self.rects, dtype=np.int32).reshape(-1, 4),
+                names=np.array(list(self.names), dtype=str),
+                crops=np.array(self.crops, dtype=np.int32).reshape(-1, 6),
+                offsets=np.array(self.offsets, dtype=np.int64),
+                pixels=np.concatenate(self.pixels) if self.pixels else np.zeros(0, dtype=np.uint8),
+            )
+        tmp.replace(path)
+
+
+class SessionRecorder:
+    """把每帧 run() 要查看的区域写入录制目录下的一个会话目录。
+    record() 在后端线程中只做裁剪和拷贝，压缩和写盘都在独立的写盘线程中进行；
+    写盘跟不上时直接丢弃新帧（计入 recorder_dropped），识别线程永远不会等待磁盘。
+    """
+
+    def __init__(
+        self,
+        root: Path = RECORDINGS_DIR,
+        chunk_frames: int = 200,
+        max_bytes: int = 0,
+        queue_size: int = 64,
+    ) -> None:
+        self.directory = root / f"session_{strftime('%Y%m%d_%H%M%S')}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dropped = 0
+        self._chunk_frames = max(1, chunk_frames)
+        self._max_bytes = max_bytes
+        self._queue: Queue = Queue(maxsize=max(1, queue_size))
+        # 已写出的分块（含之前的会话），按写出先后排列，超出磁盘上限时从最旧的开始删除
+        existing = sorted(root.glob(f"*/{_CHUNK_GLOB}"), key=lambda p: p.stat().st_mtime)
+        self._chunks: deque[tuple[Path, int]] = deque((p, p.stat().st_size) for p in existing)
+        self._total = sum(size for _, size in self._chunks)
+        self._thread = Thread(target=self._write_loop, name="recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"开始录制到 {self.directory}")
+
+    @classmethod
+    def from_config(cls) -> "SessionRecorder":
+        return cls(
+            RECORDINGS_DIR,
+            int(RECORDING.get("CHUNK_FRAMES", 200)),
+            int(float(RECORDING.get("MAX_MB", 0)) * 1024 * 1024),
+            int(RECORDING.get("QUEUE_SIZE", 64)),
+        )
+
+    def record(self, frame: GrayImage, window_rect: Rect, timestamp: float, names: frozenset[str]) -> None:
+        """裁出 names 中各区域的小图交给写盘线程。frame 是复用的缓冲区，这里必须拷贝。"""
+        with TIMERS.stage("record"):
+            h, w = frame.shape[:2]
+            crops = {}
+            for name in sorted(names):
+                x1, y1, x2, y2 = region_rect(name, window_rect)
+                rect = (max(0, x1), max(0, y1), min(w, x2), min(h, y2))
+                crops[name] = (rect, frame[rect[1]:rect[3], rect[0]:rect[2]].copy())
+            try:
+                self._queue.put_nowait((timestamp, window_rect, crops))
+            except Full:
+                if self.dropped == 0:
+                    logger.warning("录制写盘跟不上，开始丢弃帧")
+                self.dropped += 1
+                TIMERS.count("recorder_dropped")
+
+    def wrap(self, frames: Iterator[Frame], plan: RegionPlan) -> Iterator[Frame]:
+        """录制 frames 的每一帧后原样产出。取帧时 plan 声明的区域就是 run() 接下来要在这一帧上查看的区域。"""
+        for frame, window_rect, timestamp in frames:
+            self.record(frame, window_rect, timestamp, plan.names)
+            yield frame, window_rect, timestamp
+
+    def close(self) -> None:
+        """写出最后一个不满的分块并等待写盘线程结束。"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.dropped:
+            logger.warning(f"录制期间共丢弃 {self.dropped} 帧")
+        logger.info(f"录制结束: {self.directory}")
+
+    def _write_loop(self) -> None:
+        chunk = _ChunkBuilder()
+        index = 0
+        while True:
+            item = self._queue.get()
+            if item is not _STOP:
+                chunk.add(*item)
+            if chunk.times and (item is _STOP or len(chunk.times) >= self._chunk_frames):
+                try:
+                    self._flush(chunk, index)
+                except OSError as e:
+                    logger.error(f"录制分块写入失败: {e}")
+                chunk = _ChunkBuilder()
+                index += 1
+            if item is _STOP:
+                return
+
+    def _flush(self, chunk: _ChunkBuilder, index: int) -> None:
+        path = self.directory / f"chunk_{index:06d}.npz"
+        with TIMERS.stage("record_flush"):
+            chunk.save(path)
+        size = path.stat().st_size
+        logger.debug(f"录制分块已写入 {path.name}: {len(chunk.times)} 帧，{size / 1024:.0f} KB")
+        self._chunks.append((path, size))
+        self._total += size
+        # 环形上限：删除最旧的分块，刚写出的这一块始终保留
+        while self._max_bytes > 0 and self._total > self._max_bytes and len(self._chunks) > 1:
+            old, old_size = self._chunks.popleft()
+            self._total -= old_size
+            old.unlink(missing_ok=True)
+            if old.parent != self.directory and not any(old.parent.iterdir()):
+                old.parent.rmdir()
+
+
+# ---------------------------------------------------------------------------
+# 读取
+# ---------------------------------------------------------------------------
+
+
+def is_recording(path: Union[str, Path]) -> bool:
+    """path 是否是 SessionRecorder 写出的会话目录。"""
+    path = Path(path)
+    return path.is_dir() and any(path.glob(_CHUNK_GLOB))
+
+
+class Recording:
+    """按帧号读取一个会话目录。各分块只在用到时才解压，同一时间只保留一个分块。
+    产出的时间戳换算为相对于第一帧的秒数。
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._files = sorted(self.path.glob(_CHUNK_GLOB))
+        if not self._files:
+            raise FileNotFoundError(f"{self.path} 中没有录制分块")
+        times, rects, starts = [], [], []
+        for file in self._files:
+            with np.load(file) as data:
+                starts.append(sum(len(t) for t in times))
+                times.append(data["times"])
+                rects.append(data["rects"])
+        raw = np.concatenate(times)
+        self.times = raw - raw[0]
+        self.rects = np.concatenate(rects)
+        self._starts = np.array(starts)
+        self._loaded: Optional[int] = None
+        self._chunk: dict[str, np.ndarray] = {}
+        self._rows: list[np.ndarray] = []  # 分块内每帧对应的 crops 行号
+        self._canvas: Optional[GrayImage] = None
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def index_at(self, seconds: float) -> int:
+        """第一个时间不早于 seconds 的帧号。"""
+        return int(np.searchsorted(self.times, seconds))
+
+    def _load(self, index: int) -> tuple[int, int]:
+        """返回帧号 index 所在的 (分块序号, 分块内帧序号)，需要时解压该分块。"""
+        chunk = int(np.searchsorted(self._starts, index, side="right")) - 1
+        if chunk != self._loaded:
+            with np.load(self._files[chunk]) as data:
+                self._chunk = {key: data[key] for key in data.files}
+            frame_ids = self._chunk["crops"][:, 0]
+            self._rows = [np.flatnonzero(frame_ids == i) for i in range(len(self._chunk["times"]))]
+            self._loaded = chunk
+        return chunk, index - int(self._starts[chunk])
+
+    def crops(self, index: int) -> Iterator[tuple[str, Rect, np.ndarray]]:
+        """帧号 index 录下的各区域：(区域名, 像素坐标, 小图)。小图是分块数据的只读视图。"""
+        _, local = self._load(index)
+        names, crops, offsets, pixels = (self._chunk[k] for k in ("names", "crops", "offsets", "pixels"))
+        for row in self._rows[local]:
+            _, name_id, x1, y1, x2, y2 = (int(v) for v in crops[row])
+            start = int(offsets[row])
+            crop = pixels[start:start + (x2 - x1) * (y2 - y1)].reshape(y2 - y1, x2 - x1)
+            yield str(names[name_id]), (x1, y1, x2, y2), crop
+
+    def frame(self, index: int) -> Frame:
+        """帧号 index 的 (灰度图, window_rect, 时间)。灰度图是复用的整窗口画布：
+        录下的区域是这一帧的内容，其余位置保留之前各帧最后一次录下的内容（与 ROI_ONLY 截图的画布一致）。
+        """
+        left, top, right, bottom = (int(v) for v in self.rects[index])
+        window_rect = (left, top, right, bottom)
+        shape = (window_rect[3] - window_rect[1], window_rect[2] - window_rect[0])
+        if self._canvas is None or self._canvas.shape != shape:
+            self._canvas = np.zeros(shape, dtype=np.uint8)
+        for _, (x1, y1, x2, y2), crop in self.crops(index):
+            self._canvas[y1:y2, x1:x2] = crop
+        return self._canvas, window_rect, float(self.times[index])
+
+    def frames(self, start_frame: int = 0, end_frame: int = 0, sample_interval: float = 0.0) -> Iterator[Frame]:
+        """按时间顺序产出 [start_frame, end_frame) 的帧；sample_interval > 0 时每隔这么多秒取一帧。
+        录制时每一帧录下的是 run() 当时所处阶段要看的区域，跳过的帧也要贴到画布上，
+        否则采样到的帧上可能缺少 run() 在这一阶段要看的区域。
+        """
+        stop_at = min(end_frame, len(self)) if end_frame > 0 else len(self)
+        due = -np.inf
+        for index in range(start_frame, stop_at):
+            frame = self.frame(index)
+            if self.times[index] < due:
+                continue
+            due = self.times[index] + sample_interval
+            yield frame
+
+    def crops_between(
+        self, previous_time: Optional[float], frame_time: float, region: Rect
+    ) -> Iterator[tuple[float, np.ndarray]]:
+        """时间在 (previous_time, frame_time) 之间、且录下了 region 这块区域的各帧：(时间, 小图)。"""
+        if previous_time is None:
+            return
+        for index in range(self.index_at(previous_time), self.index_at(frame_time)):
+            if self.times[index] <= previous_time:
+                continue
+            for _, rect, crop in self.crops(index):
+                if rect == region:
+                    yield float(self.times[index]), crop
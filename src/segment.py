@@ -0,0 +1,135 @@
+"""
+分割-分类识别引擎。作为 recognize 中模板扫描引擎的替代方案，输出格式相同（{Card: 数量}）。
+
+模板扫描引擎把 14 张模板逐一滑过整个区域，开销 = 模板数 × 像素数。
+本引擎先在区域内一次性找出候选的牌角字形，再逐个分类，开销随场上牌数增长：
+1. 低亮度阈值反向二值化，牌角的点数字形（黑/红）变成白色连通块
+2. 按尺寸过滤连通块，只保留与某个模板字形部件大小相近的
+3. 每个连通块缩成小尺寸的二值描述子，在由模板构建的描述子索引中找出最相近的几个部件
+4. 按部件在模板中的位置反推模板左上角，只在该位置附近做一次小范围模板匹配确认
+   （沿用 THRESHOLDS["card"]，与模板扫描引擎的判定标准一致）
+5. 同一种牌的确认结果做 NMS 后计数
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from card_types import Card
+from config import THRESHOLDS
+from recognize import TEMPLATE_BANK, Image, nms_matches
+
+# 字形二值化阈值：低于此亮度的像素视为字形（红色字形转灰度后也在 60–90 左右）
+_GLYPH_THRESHOLD = 110
+# 模板中面积小于此值（scale=1.0 时）的连通块视为噪点，不作为字形部件
+_MIN_PART_AREA = 6
+# 连通块与模板部件的宽高相差不超过部件尺寸的这个比例（且至少 2 像素）时才视为尺寸相近
+_SIZE_TOLERANCE = 0.25
+# 描述子边长：连通块缩放到 _DESC_SIZE × _DESC_SIZE 的二值图
+_DESC_SIZE = 8
+# 每个连通块只对描述子距离最近的这么多个部件做模板确认
+_TOP_K = 3
+# 确认时在反推位置四周额外搜索的像素数，容忍二值化造成的边界偏差
+_SEARCH_RADIUS = 2
+
+
+class _Part(NamedTuple):
+    """描述子索引中的一项：某张牌模板里的一个字形部件。"""
+
+    card: Card
+    x: int  # 部件在模板中的左上角
+    y: int
+    w: int
+    h: int
+
+
+def _binarize(image: Image) -> Image:
+    _, binary = cv2.threshold(image, _GLYPH_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+    return binary
+
+
+def _descriptor(mask: Image) -> np.ndarray:
+    """把一个连通块的二值图缩放为固定尺寸并归一化，作为形状描述子。"""
+    small = cv2.resize(mask, (_DESC_SIZE, _DESC_SIZE), interpolation=cv2.INTER_AREA)
+    vec = small.astype(np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm > 0 else vec
+
+
+@lru_cache(maxsize=4)
+def _build_index(scale_key: float) -> tuple[list[_Part], np.ndarray]:
+    """由缩放后的牌模板构建描述子索引：每张模板的每个字形部件一项。
+    "10"、竖排的 JOKER 等字形由多个部件组成，任一部件都能反推出模板位置。
+    """
+    parts: list[_Part] = []
+    descriptors: list[np.ndarray] = []
+    min_area = max(2, round(_MIN_PART_AREA * scale_key * scale_key))
+    for card, template in TEMPLATE_BANK.cards(scale_key).items():
+        binary = _binarize(template)
+        num, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        for i in range(1, num):
+            x, y, w, h, area = (int(v) for v in stats[i])
+            if area < min_area:
+                continue
+            parts.append(_Part(card, x, y, w, h))
+            descriptors.append(_descriptor((labels[y:y + h, x:x + w] == i).astype(np.uint8) * 255))
+    logger.debug(f"已构建 scale={scale_key} 的字形描述子索引，共 {len(parts)} 个部件")
+    return parts, np.stack(descriptors)
+
+
+def identify_cards(crop: Image, scale: float = 1.0) -> dict[Card, int]:
+    """在裁剪好的区域图内识别所有卡牌，返回 {Card: 数量} 字典。"""
+    parts, index = _build_index(round(scale, 4))
+    templates = TEMPLATE_BANK.cards(scale)
+    threshold = THRESHOLDS["card"]
+    part_w = np.array([p.w for p in parts])
+    part_h = np.array([p.h for p in parts])
+    tol_w = np.maximum(2, _SIZE_TOLERANCE * part_w)
+    tol_h = np.maximum(2, _SIZE_TOLERANCE * part_h)
+
+    binary = _binarize(crop)
+    num, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    matches: dict[Card, list[tuple[float, tuple[int, int]]]] = {}
+    verified: set[tuple[Card, int, int]] = set()
+    for i in range(1, num):
+        cx, cy, cw, ch = (int(v) for v in stats[i][:4])
+        # 尺寸过滤：与任何部件都不相近的连通块（背景、牌边框、花色大图案）直接跳过
+        candidates = np.nonzero((np.abs(part_w - cw) <= tol_w) & (np.abs(part_h - ch) <= tol_h))[0]
+        if len(candidates) == 0:
+            continue
+
+        desc = _descriptor((labels[cy:cy + ch, cx:cx + cw] == i).astype(np.uint8) * 255)
+        similarity = index[candidates] @ desc
+        for k in candidates[np.argsort(-similarity)[:_TOP_K]]:
+            part = parts[k]
+            t = templates[part.card]
+            # 由部件位置反推模板左上角，只在其附近 ±_SEARCH_RADIUS 内确认
+            ox, oy = cx - part.x, cy - part.y
+            if (part.card, ox, oy) in verified:
+                continue
+            verified.add((part.card, ox, oy))
+            x1 = max(0, ox - _SEARCH_RADIUS)
+            y1 = max(0, oy - _SEARCH_RADIUS)
+            window = crop[y1:oy + t.shape[0] + _SEARCH_RADIUS, x1:ox + t.shape[1] + _SEARCH_RADIUS]
+            if t.shape[0] > window.shape[0] or t.shape[1] > window.shape[1]:
+                continue  # 反推位置超出区域边界，模板放不下
+            res = cv2.matchTemplate(window, t, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, (lx, ly) = cv2.minMaxLoc(res)
+            if max_val >= threshold:
+                matches.setdefault(part.card, []).append((float(max_val), (x1 + lx, y1 + ly)))
+
+    results: dict[Card, int] = {}
+    for card in templates:  # 按牌面顺序输出，与模板扫描引擎一致
+        card_matches = matches.get(card)
+        if not card_matches:
+            continue
+        # 同一张牌的多个部件会确认出几乎相同的位置，NMS 规则与模板扫描引擎一致
+        min_dist = max(templates[card].shape[1] // 2, 5)
+        kept = nms_matches(card_matches, min_dist)
+        results[card] = len(kept)
+        logger.debug(f"识别到 {len(kept)} 张 {card.value}（置信度最高: {kept[0][0]:.3f}）")
+    return results
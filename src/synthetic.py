@@ -0,0 +1,393 @@
+"""
+合成对局画面生成器。
+不需要游戏窗口或录屏：按 config.yaml 的 REGIONS 布局，把缩放后的牌模板和标记模板贴到纯色背景上，
+生成不同分辨率的灰度帧，按脚本化的时间线演出整局游戏（发牌、地主标记、出牌、不要、警告弹窗、底牌）。
+地主标记和警告标记按模板原始尺寸匹配，窗口小到剩余牌数区域放不下地主标记时（16:9 约 960x540 以下）无法识别开局，
+SyntheticGame 对这样的尺寸直接报错。
+frames() 产出与 live_frames / video_frames 相同的 (灰度图, window_rect, 时间)，可以直接交给 tracker.run，
+每种画面只渲染一次，生成器本身每秒可以产出上千帧，回放速度基本只取决于 run() 的识别开销。
+用于可复现的测试、基准测试和长时间压力测试。
+
+用法：
+    python synthetic.py                                     # 回放 20 局随机对局，核对识别结果并报告帧率
+    python synthetic.py --games 200 --width 1920 --height 1080 --noise 6 --jpeg 70
+    python synthetic.py --games 3 --write demo.mp4 --fps 2  # 写成录屏，可交给 debug_replay / batch_replay
+"""
+
+import argparse
+import sys
+from threading import Event
+from time import perf_counter
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from capture import Rect, region_to_pixels
+from card_types import Card, Mark, Player
+from recognize import TEMPLATE_BANK
+from tracker import FULL_DECK, PLAYERS, CardCounts, Counter, Frame, run
+
+# scale=1.0 对应的参考窗口尺寸（此时牌高 126 像素，与 calibrate 的参考高度一致）
+REF_SIZE = (1600, 900)
+# 背景和牌面的灰度值
+_BACKGROUND = 60
+_CARD_FACE = 240
+# scale=1.0 时牌的尺寸、手牌和出牌的横向间距、牌角字形相对牌左上角的偏移
+_CARD_SIZE = (100, 126)
+_HAND_STEP = 30
+_PLAY_STEP = 45
+_GLYPH_OFFSET = 3
+# 地主标记和警告标记的缩放比例：tracker 在校准 scale 之前就要找这两个标记，按模板原始尺寸匹配，
+# 所以不论分辨率，合成画面上的标记都按原始尺寸贴
+_MARK_SCALE = 1.0
+# 预先生成的噪声图数量，逐帧轮流叠加（逐帧现生成噪声太慢）
+_NOISE_POOL = 8
+
+# 各玩家出牌区域、地主标记区域
+_PLAY_REGIONS = {Player.LEFT: "playing_left", Player.MIDDLE: "playing_middle", Player.RIGHT: "playing_right"}
+_LANDLORD_REGIONS = {
+    Player.LEFT: "remaining_cards_left",
+    Player.MIDDLE: "remaining_cards_middle",
+    Player.RIGHT: "remaining_cards_right",
+}
+
+
+# ---------------------------------------------------------------------------
+# 单帧渲染
+# ---------------------------------------------------------------------------
+
+
+def _paste_cards(
+    frame: np.ndarray, region: Rect, cards: Sequence[Card], scale: float, step: int, clip_to_region: bool = True
+) -> None:
+    """在区域内从左到右依次摆放 cards：每张牌是一块浅色牌面，左上角贴该牌的字形模板。
+    后一张牌压住前一张，只露出 step 宽的一条（包括牌角字形）。
+    """
+    if not cards:
+        return
+    x1, y1, x2, y2 = region
+    templates = TEMPLATE_BANK.cards(scale)
+    cw, ch = round(_CARD_SIZE[0] * scale), round(_CARD_SIZE[1] * scale)
+    glyph_w = max(t.shape[1] for t in templates.values())
+    offset = round(_GLYPH_OFFSET * scale)
+    # 牌多时收紧间距，尽量放进区域内，但不能让相邻字形重叠
+    if len(cards) > 1 and clip_to_region:
+        step = max(glyph_w + offset, min(step, (x2 - x1 - 10 - cw) // (len(cards) - 1)))
+    bottom = y2 if clip_to_region else frame.shape[0]
+    x0, y0 = x1 + 5, y1 + 5
+    for i, card in enumerate(cards):
+        x = x0 + step * i
+        cv2.rectangle(frame, (x, y0), (x + cw, min(bottom - 1, y0 + ch)), _CARD_FACE, -1)
+        t = templates[card]
+        gx, gy = x + offset, y0 + offset
+        h, w = t.shape[:2]
+        h, w = min(h, frame.shape[0] - gy), min(w, frame.shape[1] - gx)
+        if h > 0 and w > 0:
+            frame[gy:gy + h, gx:gx + w] = t[:h, :w]
+
+
+def _paste_mark(frame: np.ndarray, region: Rect, mark: Mark, center: bool = False) -> None:
+    t = TEMPLATE_BANK.mark(mark, _MARK_SCALE)
+    if t is None:
+        return
+    x1, y1, x2, y2 = region
+    x, y = ((x1 + x2 - t.shape[1]) // 2, (y1 + y2 - t.shape[0]) // 2) if center else (x1 + 2, y1 + 2)
+    frame[y:y + t.shape[0], x:x + t.shape[1]] = t
+
+
+def _check_size(width: int, height: int) -> None:
+    """标记按原始尺寸贴，窗口太小时标记区域放不下，这样的画面 tracker 也识别不出开局，直接拒绝。"""
+    window_rect = (0, 0, width, height)
+    regions = [*_LANDLORD_REGIONS.values(), "warning_popup"]
+    marks = [Mark.LANDLORD] * len(_LANDLORD_REGIONS) + [Mark.WARNING]
+    for name, mark in zip(regions, marks):
+        t = TEMPLATE_BANK.mark(mark, _MARK_SCALE)
+        x1, y1, x2, y2 = region_to_pixels(name, window_rect)
+        if t is not None and (t.shape[0] + 2 > y2 - y1 or t.shape[1] + 2 > x2 - x1):
+            raise ValueError(f"画面 {width}x{height} 太小，{name} 区域放不下 {mark.value} 标记")
+
+
+def render_frame(
+    width: int = REF_SIZE[0],
+    height: int = REF_SIZE[1],
+    scale: Optional[float] = None,
+    landlord: Optional[Player] = None,
+    hand: Sequence[Card] = (),
+    plays: Optional[dict[Player, Sequence[Card]]] = None,
+    bottom: Sequence[Card] = (),
+    warning: bool = False,
+) -> tuple[np.ndarray, Rect]:
+    """渲染一帧灰度画面，返回 (灰度图, window_rect)。
+    scale 为模板缩放比例，默认按窗口高度相对参考高度换算；手牌排在 my_cards 区域，牌面向下延伸
+    （与真实画面一样会超出区域下沿，calibrate_scale 据此测量牌高）。
+    """
+    scale = height / REF_SIZE[1] if scale is None else scale
+    window_rect = (0, 0, width, height)
+    frame = np.full((height, width), _BACKGROUND, dtype=np.uint8)
+
+    _paste_cards(frame, region_to_pixels("my_cards", window_rect), hand, scale, round(_HAND_STEP * scale), False)
+    for player, cards in (plays or {}).items():
+        _paste_cards(frame, region_to_pixels(_PLAY_REGIONS[player], window_rect), cards, scale, round(_PLAY_STEP * scale))
+    _paste_cards(frame, region_to_pixels("three_displayed_cards", window_rect), bottom, scale, round(_PLAY_STEP * scale))
+    # 标记最后贴，压在牌面之上：小窗口下手牌的牌面下沿会伸进自己的剩余牌数区域，先贴的标记会被盖住一行
+    if landlord is not None:
+        _paste_mark(frame, region_to_pixels(_LANDLORD_REGIONS[landlord], window_rect), Mark.LANDLORD)
+    if warning:
+        _paste_mark(frame, region_to_pixels("warning_popup", window_rect), Mark.WARNING, center=True)
+    return frame, window_rect
+
+
+# ---------------------------------------------------------------------------
+# 脚本化对局
+# ---------------------------------------------------------------------------
+
+
+class _Scene(NamedTuple):
+    """时间线上的一段：画面内容保持不变的连续 frames 帧。"""
+
+    landlord: Optional[Player]
+    hand: tuple[Card, ...]
+    plays: tuple[tuple[Player, tuple[Card, ...]], ...]
+    bottom: tuple[Card, ...]
+    warning: bool
+    frames: int
+
+
+class SyntheticGame:
+    """脚本化的合成画面时间线。各方法按时间顺序追加画面，返回 self 以便链式调用：
+
+        game = (SyntheticGame(1920, 1080)
+                .idle(3)
+                .start(Player.LEFT, my_hand)
+                .play(Player.LEFT, [Card.THREE, Card.THREE])
+                .pass_(Player.MIDDLE)
+                .play(Player.RIGHT, [Card.TWO] * 2)
+                .end([Card.Q, Card.NINE, Card.FIVE]))
+        run(game.frames(), counter, Event())
+
+    每个出牌区显示该玩家最近一次出的牌，轮到该玩家时清空（play / pass_ 先演出 think 帧的清空画面）。
+    expected 按顺序记录脚本中的每一手牌 (玩家, {Card: 数量})，与 run() 的 on_update 回调一一对应，用于核对识别结果。
+    """
+
+    def __init__(
+        self,
+        width: int = REF_SIZE[0],
+        height: int = REF_SIZE[1],
+        scale: Optional[float] = None,
+        noise: int = 0,
+        jpeg_quality: int = 0,
+        seed: int = 0,
+    ) -> None:
+        """noise > 0 时逐帧叠加幅度约为 ±noise 的随机噪声；jpeg_quality > 0 时每种画面先按该质量做一次 JPEG 压缩。
+        画面小到放不下地主标记或警告标记时抛出 ValueError。"""
+        _check_size(width, height)
+        self.width = width
+        self.height = height
+        self.scale = height / REF_SIZE[1] if scale is None else scale
+        self.noise = noise
+        self.jpeg_quality = jpeg_quality
+        self.seed = seed
+        self.expected: list[tuple[Player, CardCounts]] = []
+        self._scenes: list[_Scene] = []
+        self._landlord: Optional[Player] = None
+        self._hand: list[Card] = []
+        self._plays: dict[Player, tuple[Card, ...]] = {}
+        self._bottom: tuple[Card, ...] = ()
+
+    @property
+    def total_frames(self) -> int:
+        return sum(s.frames for s in self._scenes)
+
+    def _add(self, frames: int, warning: bool = False) -> "SyntheticGame":
+        if frames > 0:
+            plays = tuple((p, self._plays[p]) for p in PLAYERS if p in self._plays)
+            self._scenes.append(
+                _Scene(self._landlord, tuple(self._hand), plays, self._bottom, warning, frames)
+            )
+        return self
+
+    def idle(self, frames: int = 3) -> "SyntheticGame":
+        """对局之外的空白画面（没有地主标记、手牌和出牌）。"""
+        self._landlord = None
+        self._hand = []
+        self._plays = {}
+        self._bottom = ()
+        return self._add(frames)
+
+    def start(self, landlord: Player, hand: Sequence[Card], frames: int = 3) -> "SyntheticGame":
+        """发牌完毕、地主确定：显示地主标记和自己的手牌（自己是地主时 hand 应为含底牌的 20 张）。"""
+        self._landlord = landlord
+        self._hand = list(hand)
+        self._plays = {}
+        self._bottom = ()
+        return self._add(frames)
+
+    def play(self, player: Player, cards: Sequence[Card], frames: int = 2, think: int = 1) -> "SyntheticGame":
+        """player 出牌：先清空其出牌区 think 帧，再显示 cards 共 frames 帧。自己出的牌同时从手牌中移除。"""
+        self._plays.pop(player, None)
+        self._add(think)
+        if player == Player.MIDDLE:
+            for card in cards:
+                self._hand.remove(card)
+        self._plays[player] = tuple(cards)
+        counts: CardCounts = {}
+        for card in cards:
+            counts[card] = counts.get(card, 0) + 1
+        self.expected.append((player, counts))
+        return self._add(frames)
+
+    def pass_(self, player: Player, frames: int = 2) -> "SyntheticGame":
+        """player 不要：清空其出牌区。"""
+        self._plays.pop(player, None)
+        return self._add(frames)
+
+    def warning(self, frames: int = 1) -> "SyntheticGame":
+        """在当前画面上叠加警告弹窗标记。"""
+        return self._add(frames, warning=True)
+
+    def end(self, bottom: Sequence[Card], frames: int = 1) -> "SyntheticGame":
+        """对局结束：顶部显示三张底牌。"""
+        self._bottom = tuple(bottom)
+        return self._add(frames)
+
+    def _render(self, scene: _Scene) -> np.ndarray:
+        frame, _ = render_frame(
+            self.width, self.height, self.scale, scene.landlord, scene.hand,
+            dict(scene.plays), scene.bottom, scene.warning,
+        )
+        if self.jpeg_quality > 0:
+            _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            frame = np.asarray(cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE))
+        return frame
+
+    def frames(self, fps: float = 2.0) -> Iterator[Frame]:
+        """按时间线产出 (灰度图, window_rect, 时间)，时间按 fps 帧/秒从 0 开始计。
+        没有噪声时同一段画面的各帧是同一个只读数组。"""
+        window_rect = (0, 0, self.width, self.height)
+        noise: list[tuple[np.ndarray, np.ndarray]] = []
+        if self.noise > 0:
+            # 两张非负噪声图一加一减（饱和运算），合起来是幅度 ±noise 的有符号噪声
+            rng = np.random.default_rng(self.seed)
+            shape = (self.height, self.width)
+            noise = [
+                (
+                    rng.integers(0, self.noise + 1, shape, dtype=np.uint8),
+                    rng.integers(0, self.noise + 1, shape, dtype=np.uint8),
+                )
+                for _ in range(_NOISE_POOL)
+            ]
+        rendered: dict[_Scene, np.ndarray] = {}  # 内容相同的画面（如反复出现的空白画面）只渲染一次
+        i = 0
+        for scene in self._scenes:
+            key = scene._replace(frames=0)
+            frame = rendered.get(key)
+            if frame is None:
+                frame = rendered[key] = self._render(scene)
+                frame.flags.writeable = False
+            for _ in range(scene.frames):
+                timestamp = i / fps
+                if noise:
+                    add, sub = noise[i % len(noise)]
+                    yield cv2.subtract(cv2.add(frame, add), sub), window_rect, timestamp
+                else:
+                    yield frame, window_rect, timestamp
+                i += 1
+
+
+def random_game(game: SyntheticGame, rng: np.random.Generator, pass_rate: float = 0.2) -> SyntheticGame:
+    """在 game 的时间线上追加一局随机对局：随机发牌和地主，三家轮流出一组同点数的牌或不要，
+    直到有人出完手牌。不遵守真实的出牌规则，只用于产生内容多样的画面。
+    """
+    deck = [card for card, n in FULL_DECK.items() for _ in range(n)]
+    order = rng.permutation(len(deck))
+    deck = [deck[i] for i in order]
+    landlord = PLAYERS[int(rng.integers(len(PLAYERS)))]
+    hands = {p: deck[17 * i:17 * (i + 1)] for i, p in enumerate(PLAYERS)}
+    bottom = deck[51:]
+    hands[landlord] += bottom
+    game.idle(int(rng.integers(2, 5))).start(landlord, hands[Player.MIDDLE])
+
+    turn = PLAYERS.index(landlord)
+    last_player = landlord
+    while all(hands.values()):
+        player = PLAYERS[turn % len(PLAYERS)]
+        turn += 1
+        # 上一手是自己出的（另两家都不要）时必须出牌
+        if last_player != player and rng.random() < pass_rate:
+            game.pass_(player)
+            continue
+        hand = hands[player]
+        card = hand[int(rng.integers(len(hand)))]
+        count = int(rng.integers(1, hand.count(card) + 1))
+        for _ in range(count):
+            hand.remove(card)
+        game.play(player, [card] * count, frames=int(rng.integers(2, 5)))
+        last_player = player
+    return game.end(bottom)
+
+
+# ---------------------------------------------------------------------------
+# 命令行：回放随机对局，核对识别结果并报告帧率
+# ---------------------------------------------------------------------------
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="记牌器合成对局画面生成器")
+    parser.add_argument("--games", type=int, default=20, help="随机对局数（默认 20）")
+    parser.add_argument("--width", type=int, default=REF_SIZE[0], help="画面宽度（16:9 时不小于约 960）")
+    parser.add_argument("--height", type=int, default=REF_SIZE[1], help="画面高度（16:9 时不小于约 540）")
+    parser.add_argument("--scale", type=float, help="模板缩放比例（默认按画面高度换算）")
+    parser.add_argument("--noise", type=int, default=0, help="逐帧叠加的噪声幅度（默认 0）")
+    parser.add_argument("--jpeg", type=int, default=0, metavar="QUALITY", help="JPEG 压缩质量，0 表示不压缩（默认 0）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--write", metavar="OUTPUT", help="不回放，而是把画面写成录屏文件（如 demo.mp4）")
+    parser.add_argument("--fps", type=float, default=2.0, help="--write 录屏的帧率（默认 2）")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter={"": "WARNING", "__main__": "INFO"})
+
+    rng = np.random.default_rng(args.seed)
+    try:
+        game = SyntheticGame(args.width, args.height, args.scale, args.noise, args.jpeg, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    for _ in range(args.games):
+        random_game(game, rng)
+    logger.info(f"生成 {args.games} 局，共 {game.total_frames} 帧，{len(game.expected)} 手牌")
+
+    if args.write:
+        writer = cv2.VideoWriter(args.write, cv2.VideoWriter.fourcc(*"mp4v"), args.fps, (args.width, args.height))
+        for gray, _, _ in game.frames(args.fps):
+            writer.write(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+        writer.release()
+        logger.info(f"录屏已保存到: {args.write}")
+        return
+
+    detected: list[tuple[Player, CardCounts]] = []
+    frames_read = 0
+
+    def counted() -> Iterator[Frame]:
+        nonlocal frames_read
+        for item in game.frames():
+            frames_read += 1
+            yield item
+
+    start = perf_counter()
+    try:
+        run(counted(), Counter(), Event(), on_update=lambda p, cards: detected.append((p, dict(cards))))
+    except StopIteration:
+        pass
+    elapsed = perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(detected, game.expected) if a != b) + abs(len(detected) - len(game.expected))
+    logger.info(
+        f"回放 {frames_read} 帧，耗时 {elapsed:.2f}s（{frames_read / elapsed:.0f} 帧/秒），"
+        f"识别到 {len(detected)} 手牌，脚本 {len(game.expected)} 手，不一致 {mismatches} 处"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,25 +3,63 @@
 通过帧迭代器接收图像，与截图来源解耦（支持实时截图和录屏回放）。
 """
 
-import tkinter as tk
-from threading import Event, Thread
-from time import sleep
-from typing import Callable, Iterator, Optional
+from collections import deque
+from functools import partial
+from queue import SimpleQueue
+from threading import Condition, Event, Lock, Thread
+from time import monotonic
+from typing import Callable, Iterator, NamedTuple, Optional
 
 import numpy as np
 from loguru import logger
 
-from capture import find_game_window, region_to_pixels, take_screenshot
+from capture import (
+    CALIBRATION_REGION,
+    CaptureSession,
+    Frame,
+    RegionPlan,
+    WindowLocator,
+    find_game_window,
+    region_to_pixels,
+    take_screenshot,
+)
 from calibrate import calibrate_scale
-from config import GAME_START_INTERVAL, SCREENSHOT_INTERVAL, THRESHOLDS
-from recognize import has_warning, identify_cards, match_mark
+from config import CAPTURE, GAME_START_INTERVAL, RECORDING, SCHEDULER, SCREENSHOT_INTERVAL, THRESHOLDS
+from recognize import (
+    RESULT_CACHE,
+    TEMPLATE_BANK,
+    ChangeGate,
+    WarningDetector,
+    identify_cards,
+    identify_cards_batch,
+    match_mark,
+    shutdown_parallel,
+)
 from card_types import Card, Mark, Player
+from profiling import TIMERS
+from recorder import SessionRecorder
 
 GrayImage = np.ndarray
 CardCounts = dict[Card, int]
 OnUpdateFn = Callable[[Player, CardCounts], None]  # 每次检测到出牌时的回调
 
 
+class PlayTiming(NamedTuple):
+    """一手牌从画面到计数的时间（单位秒，与帧的画面时刻同一时间基准）。"""
+
+    player: Player
+    cards: CardCounts
+    frame_time: float  # 识别出这手牌的那一帧的画面时刻
+    counted_at: float  # 计数更新完成（publish 之后）时 clock() 的读数
+
+    @property
+    def latency(self) -> float:
+        return self.counted_at - self.frame_time
+
+
+OnTimingFn = Callable[[PlayTiming], None]
+
+
 # ---------------------------------------------------------------------------
 # 计数状态
 # ---------------------------------------------------------------------------
@@ -29,49 +67,90 @@ OnUpdateFn = Callable[[Player, CardCounts], None]  # 每次检测到出牌时的
 # 一副完整的牌：除大小王各1张外，其余每种牌4张
 FULL_DECK: CardCounts = {**{card: 4 for card in Card}, Card.JOKER: 2}
 
+# 计数用定长数组表示：第 i 个位置对应 Card 中的第 i 种牌
+CARDS: list[Card] = list(Card)
+CARD_INDEX: dict[Card, int] = {card: i for i, card in enumerate(CARDS)}
+FULL_DECK_ARRAY = np.array([FULL_DECK[card] for card in CARDS], dtype=np.int32)
+
+# 计数表名：remaining（剩余）、left（上家已出）、right（下家已出），与 Counter.counts 的行一一对应
+CountTable = str
+COUNT_TABLES: tuple[CountTable, ...] = ("remaining", "left", "right")
+# 一批计数变化：{(表名, 牌): 新值}
+CountUpdate = dict[tuple[CountTable, Card], int]
+
+
+def counts_to_array(counts: CardCounts) -> np.ndarray:
+    """把识别结果 {Card: 数量} 转成按 CARDS 顺序排列的定长数组。"""
+    arr = np.zeros(len(CARDS), dtype=np.int32)
+    for card, count in counts.items():
+        arr[CARD_INDEX[card]] = count
+    return arr
+
 
 class Counter:
-    """维护剩余牌数和各玩家出牌数的 Tkinter 变量。
-    使用 tk.IntVar 而不是普通 int，是因为 UI 标签通过 textvariable 绑定到这些变量，
-    变量一旦更新，标签会自动刷新，无需手动通知 UI。
+    """维护剩余牌数和各玩家出牌数，不依赖 tkinter。
+    三张计数表存放在一个 3×14 的整数数组里（行按 COUNT_TABLES，列按 CARDS），
+    remaining / left / right 是各行的视图，用 CARD_INDEX[card] 取某种牌的数量；
+    重置、记一手牌、求总数都是整行的数组运算。
+    计数由后端线程修改，而 tkinter 只能在主线程中操作，所以 UI 不直接读写这里的数组：
+    run() 每处理完一帧调用 publish()，把与上次发布时不同的格子作为一批放进 updates 队列，
+    由 UI 在主线程中定时取出并统一刷新。
+    没有 UI 取用时（如 debug_replay）传 publish_updates=False，变化不会在队列里越积越多。
     """
 
-    def __init__(self) -> None:
-        self.remaining: dict[Card, tk.IntVar] = {
-            card: tk.IntVar(value=v) for card, v in FULL_DECK.items()
-        }
-        self.left: dict[Card, tk.IntVar] = {card: tk.IntVar(value=0) for card in Card}
-        self.right: dict[Card, tk.IntVar] = {card: tk.IntVar(value=0) for card in Card}
-        # 各玩家总出牌张数（纯计数，不需要绑定 UI，用普通 int 即可）
+    def __init__(self, publish_updates: bool = False) -> None:
+        self.counts = np.zeros((len(COUNT_TABLES), len(CARDS)), dtype=np.int32)
+        self.counts[0] = FULL_DECK_ARRAY
+        self.remaining, self.left, self.right = self.counts  # 行视图，原地修改会反映到 counts
+        # 各玩家总出牌张数（不在 UI 上显示，不需要发布）
         self.total_played = {Player.LEFT: 0, Player.MIDDLE: 0, Player.RIGHT: 0}
+        self._publish_updates = publish_updates
+        self._published = self.counts.copy()  # 上次发布时的计数，publish 与之对比得出变化
+        # SimpleQueue 的 put/get 无需额外加锁
+        self.updates: SimpleQueue[CountUpdate] = SimpleQueue()
 
     def reset(self) -> None:
-        for card in Card:
-            self.remaining[card].set(FULL_DECK[card])
-            self.left[card].set(0)
-            self.right[card].set(0)
+        self.counts[0] = FULL_DECK_ARRAY
+        self.counts[1:] = 0
         self.total_played = {p: 0 for p in Player}
+        self.publish()
 
     def mark(self, card: Card, player: Player, count: int = 1, affect_remaining: bool = True) -> None:
+        played = np.zeros(len(CARDS), dtype=np.int32)
+        played[CARD_INDEX[card]] = count
+        self.mark_play(player, played, affect_remaining)
+
+    def mark_play(self, player: Player, played: np.ndarray, affect_remaining: bool = True) -> None:
+        """记录一手牌，played 为按 CARDS 顺序排列的各牌张数（见 counts_to_array）。"""
         if affect_remaining:
-            new_val = self.remaining[card].get() - count
-            if new_val < 0:
-                logger.warning(f"剩余 {card.value} 数量变为负数，可能有误识别")
-            self.remaining[card].set(new_val)
-        else:
-            new_val = self.remaining[card].get()
+            self.remaining -= played
+            for i in np.flatnonzero((self.remaining < 0) & (played > 0)):
+                logger.warning(f"剩余 {CARDS[i].value} 数量变为负数，可能有误识别")
 
         if player == Player.LEFT:
-            self.left[card].set(self.left[card].get() + count)
+            self.left += played
         elif player == Player.RIGHT:
-            self.right[card].set(self.right[card].get() + count)
+            self.right += played
+
+        self.total_played[player] += int(played.sum())
+        for i in np.flatnonzero(played):
+            logger.info(f"{player.value} 出了 {played[i]} 张 {CARDS[i].value}，剩余 {self.remaining[i]}")
 
-        self.total_played[player] += count
-        logger.info(f"{player.value} 出了 {count} 张 {card.value}，剩余 {new_val}")
+    def publish(self) -> None:
+        """把自上次发布以来变化的格子作为一批发布出去（没有变化时什么都不做）。"""
+        if not self._publish_updates:
+            return
+        rows, cols = np.nonzero(self.counts != self._published)
+        if len(rows) == 0:
+            return
+        self.updates.put(
+            {(COUNT_TABLES[t], CARDS[c]): int(self.counts[t, c]) for t, c in zip(rows, cols)}
+        )
+        self._published[:] = self.counts
 
     @property
     def total_remaining(self) -> int:
-        return sum(v.get() for v in self.remaining.values())
+        return int(self.remaining.sum())
 
 
 # ---------------------------------------------------------------------------
@@ -92,7 +171,7 @@ def verify_counts(counter: Counter, landlord: Player, last_player: Player) -> No
 
     # 检查每种牌的剩余数量是否合法
     for card in Card:
-        val = counter.remaining[card].get()
+        val = int(counter.remaining[CARD_INDEX[card]])
         max_val = FULL_DECK[card]
         if val < 0:
             logger.warning(f"剩余 {card.value} 为 {val}，小于 0")
@@ -129,27 +208,243 @@ def verify_counts(counter: Counter, landlord: Player, last_player: Player) -> No
 # ---------------------------------------------------------------------------
 
 
+class FrameScheduler:
+    """决定帧来源什么时候截下一帧。由 run() 和 live_frames 共享：
+    run() 告诉它当前处于哪个阶段、这一帧有没有新的出牌，live_frames 按它给出的截止时刻等待。
+    截止时刻按截图开始时刻累加间隔计算，识别耗时算在间隔之内；
+    某一帧处理超时的话下一帧立即开始，不会为了追赶进度连续截图。
+    """
+
+    def __init__(self) -> None:
+        self._min = float(SCHEDULER.get("MIN_INTERVAL", SCREENSHOT_INTERVAL))
+        self._max = float(SCHEDULER.get("MAX_INTERVAL", SCREENSHOT_INTERVAL))
+        self._backoff = float(SCHEDULER.get("BACKOFF", 1.0))
+        self._interval = GAME_START_INTERVAL
+        self._last = monotonic()
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    def waiting(self) -> None:
+        """等待游戏开始：按 GAME_START_INTERVAL 轮询。"""
+        self._interval = GAME_START_INTERVAL
+
+    def playing(self) -> None:
+        """游戏刚开始：先按 SCREENSHOT_INTERVAL 截图，之后由 report 调整。"""
+        self._interval = SCREENSHOT_INTERVAL
+
+    def report(self, active: bool) -> None:
+        """报告这一帧有没有新的出牌：有则立即缩短到最小间隔，没有则逐帧退避到最大间隔。"""
+        if active:
+            self._interval = self._min
+        else:
+            self._interval = min(self._max, max(self._min, self._interval * self._backoff))
+
+    def wait(self, stop_event: Event) -> None:
+        """等到下一帧的截止时刻；收到停止信号时立即返回。"""
+        target = self._last + self._interval
+        delay = target - monotonic()
+        if delay > 0:
+            stop_event.wait(delay)
+        self._last = max(target, monotonic())
+
+
 def live_frames(
-    initial_window_rect: Optional[tuple[int, int, int, int]], stop_event: Event
-) -> Iterator[tuple[GrayImage, tuple[int, int, int, int]]]:
-    """实时截图帧迭代器，产出 (灰度图, window_rect)。
-    每帧重新查询游戏窗口位置，支持用户在游戏中途移动窗口。
-    若窗口找不到（已关闭），沿用上一帧的位置继续尝试。
+    initial_window_rect: Optional[tuple[int, int, int, int]],
+    stop_event: Event,
+    scheduler: FrameScheduler,
+    plan: Optional[RegionPlan] = None,
+) -> Iterator[Frame]:
+    """实时截图帧迭代器，产出 (灰度图, window_rect, 截图开始时的 monotonic())。
+    每帧通过 WindowLocator 重新读取游戏窗口位置，支持用户在游戏中途移动窗口；
+    窗口关闭后才重新枚举查找（有频率限制）。
+    警告弹窗由 WarningDetector 按自己的节奏检测，检测到弹窗期间的帧直接跳过。
+    传入 plan 且 run() 已声明需要的区域时，只截取这些区域和弹窗区域中部的探测窄条（整个弹窗区域只在需要检测时补截），
+    产出的整窗口画布上只有这些区域是最新内容。
+    整个迭代过程复用同一个 CaptureSession，产出的灰度图是复用的缓冲区，下一帧会被覆盖。
+    两帧之间的等待由 scheduler 决定，它必须同时传给 run()：run() 向它报告阶段和出牌，截图节奏才会随游戏进展自适应。
     收到停止信号后立即退出，不再产出新帧。
     """
     window_rect = initial_window_rect
-    while not stop_event.is_set():
-        latest = find_game_window()
-        if latest is not None:
-            window_rect = latest
-        frame = take_screenshot(window_rect, stop_event)
-        if frame is None:
-            return  # 截图返回 None 说明收到了停止信号
-        if has_warning(frame, 1.0):
-            sleep(SCREENSHOT_INTERVAL)
-            continue  # 检测到警告弹窗，跳过该帧
-        yield frame, window_rect
-        sleep(SCREENSHOT_INTERVAL)
+    locator = WindowLocator(CAPTURE.get("WINDOW_RECHECK_INTERVAL", 2.0))
+    warning = WarningDetector()
+    # 会话在生成器体内创建，保证 mss 句柄属于实际消费帧的后端线程
+    with CaptureSession() as session:
+        while not stop_event.is_set():
+            with TIMERS.stage("locate_window"):
+                latest = locator.locate()
+            if latest is not None:
+                window_rect = latest
+            regions = set(plan.names) if plan is not None else set()
+            # 窗口未找到时截的是全屏，没有可换算的弹窗区域，在整张截图中检测
+            popup_region = region_to_pixels("warning_popup", window_rect) if window_rect is not None else None
+            probe_region = None
+            refresh = None
+            if regions and window_rect is not None:
+                # 弹窗区域每帧只截中部窄条：WarningDetector 逐帧比较它的缩略图，
+                # 变化明显或到了强制检测的帧才补截整个弹窗区域做模板匹配
+                regions.add("warning_probe")
+                probe_region = region_to_pixels("warning_probe", window_rect)
+                refresh = partial(take_screenshot, window_rect, stop_event, session, ["warning_popup"])
+            captured_at = monotonic()
+            with TIMERS.stage("screenshot"):
+                frame = take_screenshot(window_rect, stop_event, session, regions)
+            if frame is None:
+                return  # 截图返回 None 说明收到了停止信号
+            with TIMERS.stage("has_warning"):
+                has_popup = warning.check(frame, popup_region, probe_region, refresh)
+            if not has_popup:  # 检测到警告弹窗时跳过该帧
+                yield frame, window_rect, captured_at
+            else:
+                TIMERS.count("popup_frames_skipped")
+            scheduler.wait(stop_event)
+
+
+# 截图流水线每截取这么多帧在 DEBUG 日志中报告一次队列状态
+_PIPELINE_REPORT_EVERY = 100
+
+
+class _FramePool:
+    """截图流水线的帧缓冲池。帧来源产出的灰度图是复用的缓冲区（见 CaptureSession），
+    进入队列前必须拷贝出来；拷贝的目标从池中取，用完归还，避免每帧分配新的整窗口数组。
+    同时在用的缓冲区最多为：队列容量 + run() 正在处理的一帧 + 截图线程正在写的一帧。
+    """
+
+    def __init__(self) -> None:
+        self._free: list[GrayImage] = []
+        self._lock = Lock()
+
+    def acquire(self, shape: tuple[int, ...]) -> GrayImage:
+        with self._lock:
+            for i, buf in enumerate(self._free):
+                if buf.shape == shape:
+                    return self._free.pop(i)
+        # 没有同尺寸的空闲缓冲区（刚启动或窗口大小改变），分配新的
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buf: GrayImage) -> None:
+        with self._lock:
+            self._free.append(buf)
+            # 窗口大小改变后旧尺寸的缓冲区不会再被取用，只保留最近归还的几个
+            del self._free[:-8]
+
+
+class FramePipeline:
+    """把帧来源放到独立的截图线程里运行，与识别（run()）并行。
+    截图线程把带截图时刻的帧放进一个有界队列，run() 从队列中取帧；队列满时的策略：
+    - drop_oldest：丢弃队列中最旧的帧，run() 依次处理其余的帧（延迟有上限，不漏掉短暂出现的画面）
+    - keep_latest：只保留最新的一帧，run() 每次拿到的都是最新画面（延迟最低）
+    传入 plan 时，run() 切换截图区域之前截取的帧会被直接丢弃，保证 run() 拿到的帧包含它声明的区域。
+    """
+
+    def __init__(
+        self,
+        source: Iterator[Frame],
+        stop_event: Event,
+        plan: Optional[RegionPlan] = None,
+        size: int = 2,
+        policy: str = "drop_oldest",
+    ) -> None:
+        self._source = source
+        self._stop_event = stop_event
+        self._plan = plan
+        self._size = max(1, size)
+        self._keep_latest = policy == "keep_latest"
+        # (灰度图, window_rect, 截图时刻, 入队时刻, 截图时的区域代数)
+        self._queue: deque[tuple[GrayImage, tuple[int, int, int, int], float, float, int]] = deque()
+        self._cond = Condition()
+        self._pool = _FramePool()
+        self._done = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        # 统计信息
+        self.captured = 0
+        self.dropped = 0  # 队列满被丢弃的帧
+        self.stale = 0  # 截图区域切换前截取、被丢弃的帧
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def _generation(self) -> int:
+        return self._plan.generation if self._plan is not None else 0
+
+    def _capture_loop(self) -> None:
+        try:
+            while not self._stop_event.is_set() and not self._closed:
+                # 先记下区域版本再截图：截到的帧至少包含这一版本声明的区域
+                generation = self._generation()
+                try:
+                    frame, window_rect, frame_time = next(self._source)
+                except StopIteration:
+                    break
+                buf = self._pool.acquire(frame.shape)
+                np.copyto(buf, frame)
+                with self._cond:
+                    if self._keep_latest:
+                        dropped = list(self._queue)
+                        self._queue.clear()
+                    elif len(self._queue) >= self._size:
+                        dropped = [self._queue.popleft()]
+                    else:
+                        dropped = []
+                    self._queue.append((buf, window_rect, frame_time, monotonic(), generation))
+                    self.captured += 1
+                    self.dropped += len(dropped)
+                    self.max_depth = max(self.max_depth, len(self._queue))
+                    self._cond.notify()
+                for item in dropped:
+                    self._pool.release(item[0])
+                if dropped:
+                    TIMERS.count("pipeline_dropped", len(dropped))
+                if self.captured % _PIPELINE_REPORT_EVERY == 0:
+                    logger.debug(self.summary())
+        except BaseException as e:  # 截图线程的异常交给 run() 所在线程抛出
+            self._error = e
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify()
+
+    def summary(self) -> str:
+        return (
+            f"截图流水线: 已截取 {self.captured} 帧，队列满丢弃 {self.dropped} 帧，"
+            f"区域切换丢弃 {self.stale} 帧，当前队列深度 {self.depth}，最大深度 {self.max_depth}"
+        )
+
+    def __iter__(self) -> Iterator[Frame]:
+        # 截图线程在第一次取帧时才启动，帧来源（及其 CaptureSession）只在截图线程中使用
+        Thread(target=self._capture_loop, name="capture", daemon=True).start()
+        held: Optional[GrayImage] = None
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self._done:
+                        if self._stop_event.is_set():
+                            return
+                        self._cond.wait(timeout=0.1)
+                    if not self._queue:
+                        break  # 帧来源已耗尽
+                    buf, window_rect, frame_time, queued_at, generation = self._queue.popleft()
+                # run() 取下一帧时说明上一帧已经处理完，其缓冲区可以归还
+                if held is not None:
+                    self._pool.release(held)
+                held = buf
+                if generation < self._generation():
+                    self.stale += 1
+                    TIMERS.count("pipeline_stale")
+                    continue
+                logger.trace(f"取出队列中的帧，已等待 {monotonic() - queued_at:.3f}s")
+                if TIMERS.enabled:
+                    TIMERS.add("queue_wait", monotonic() - queued_at)
+                yield buf, window_rect, frame_time
+        finally:
+            self._closed = True
+            logger.info(self.summary())
+        if self._error is not None:
+            raise self._error
 
 
 # ---------------------------------------------------------------------------
@@ -173,25 +468,49 @@ PLAY_REGIONS = {
 }
 
 
+def _report_timing(timing: PlayTiming, on_timing: Optional[OnTimingFn]) -> None:
+    """记录一手牌从画面到计数的延迟：写入 TIMERS 的 frame_to_count 阶段，并交给 on_timing 回调。"""
+    logger.debug(f"{timing.player.value} 出牌从画面到计数用时 {timing.latency * 1000:.1f}ms")
+    if TIMERS.enabled:
+        TIMERS.add("frame_to_count", timing.latency)
+    if on_timing:
+        on_timing(timing)
+
+
 def run(
-    frames: Iterator[tuple[GrayImage, tuple[int, int, int, int]]],
+    frames: Iterator[Frame],
     counter: Counter,
     stop_event: Event,
     on_update: Optional[OnUpdateFn] = None,
     mark_potential_bombs: Optional[Callable[[set], None]] = None,
     on_reset: Optional[Callable[[], None]] = None,
+    plan: Optional[RegionPlan] = None,
+    scheduler: Optional[FrameScheduler] = None,
+    clock: Callable[[], float] = monotonic,
+    on_timing: Optional[OnTimingFn] = None,
 ) -> None:
     """
     游戏主循环。
-    - frames: 帧迭代器，每次产出 (灰度图, window_rect)；
+    - frames: 帧迭代器，每次产出 (灰度图, window_rect, 画面时刻)；
       window_rect 每帧更新，支持用户移动窗口后仍能正确识别
     - counter: 计数状态对象（由调用方持有，以便 UI 绑定）
     - stop_event: 外部停止信号
     - on_update: 每次出牌后的回调（可选，供 UI 或调试工具使用）
     - mark_potential_bombs: 识别完手牌后调用，传入我没有的牌的集合（可选）；
       没有某种牌意味着自己手里没有该牌，UI 用红色高亮提示用户，方便推算对手持牌
+    - plan: 与帧来源共享的区域声明（可选）；每个阶段开始前声明接下来要看的区域，
+      帧来源据此只截取这些区域
+    - scheduler: 与帧来源共享的截图节奏（可选）；run() 报告当前阶段和每帧是否有新出牌，
+      帧来源据此决定下一帧的截图时刻。run() 本身从不等待，节奏完全由帧来源控制
+    - clock: 当前时刻，与帧的画面时刻同一时间基准；实时截图用 monotonic，
+      录屏回放传入按视频时间走的时钟（见 debug_replay.ReplayClock）
+    - on_timing: 每手牌计数更新完成后的回调（可选），传入 PlayTiming，用于统计从画面到计数的延迟
     """
 
+    def request_regions(*names: str) -> None:
+        if plan is not None:
+            plan.request(names)
+
     while not stop_event.is_set():
         # ── 等待游戏开始 ──────────────────────────────────────────────────
         # 通过检测三个玩家的剩余牌数区域是否出现地主皇冠标记来判断游戏开始
@@ -202,21 +521,27 @@ def run(
         landlord: Optional[Player] = None
         frame: GrayImage = np.zeros((1, 1), dtype=np.uint8)
         window_rect: tuple[int, int, int, int] = (0, 0, 0, 0)
+        frame_time = 0.0
+        request_regions(*LANDLORD_REGIONS.values())
+        if scheduler is not None:
+            scheduler.waiting()
 
-        for frame, window_rect in frames:  # type: GrayImage, tuple[int,int,int,int]
+        for frame, window_rect, frame_time in frames:  # type: GrayImage, tuple[int,int,int,int], float
             if stop_event.is_set():
                 return
 
             # 同时检查三个区域，置信度最高的那个就是地主位置
-            confidences = {
-                p: match_mark(
-                    frame,
-                    region_to_pixels(LANDLORD_REGIONS[p], window_rect),
-                    Mark.LANDLORD,
-                    1.0,
-                )
-                for p in PLAYERS
-            }
+            with TIMERS.stage("match_landlord"):
+                confidences = {
+                    p: match_mark(
+                        frame,
+                        region_to_pixels(LANDLORD_REGIONS[p], window_rect),
+                        Mark.LANDLORD,
+                        1.0,
+                    )
+                    for p in PLAYERS
+                }
+            TIMERS.maybe_report()
             best = max(confidences, key=lambda p: confidences[p])
             if confidences[best] >= THRESHOLDS["landlord"]:
                 landlord = best
@@ -225,28 +550,32 @@ def run(
                 )
                 break
 
-            sleep(GAME_START_INTERVAL)
-
         if stop_event.is_set():
             return
 
-        # ── 自动校准 scale ────────────────────────────────────────────────
-        # 地主确定后手牌已发完，用当前帧的手牌高度估算模板缩放比例
         if landlord is None:
             return  # 帧迭代器耗尽但未找到地主，正常退出
-        scale = calibrate_scale(frame, window_rect)
+
+        # ── 自动校准 scale ────────────────────────────────────────────────
+        # 地主确定后手牌已发完，取下一帧，用手牌高度估算模板缩放比例
+        # （校准与手牌识别用同一帧，只截取区域时这一帧才包含手牌）
+        request_regions("my_cards", CALIBRATION_REGION)
+        frame, window_rect, frame_time = next(frames)  # type: GrayImage, tuple[int,int,int,int], float
+        with TIMERS.stage("calibrate_scale"):
+            scale = calibrate_scale(frame, window_rect)
+            TEMPLATE_BANK.cards(scale)  # 预先构建本局所有牌面识别共用的缩放模板
 
         # ── 识别自己的手牌 ────────────────────────────────────────────────
         # 游戏开始后立即识别自己的手牌并从剩余牌数中扣除，
         # 这样剩余数就代表"除了我自己的牌以外还有多少张在场上"
-        frame, window_rect = next(frames)  # type: GrayImage, tuple[int,int,int,int]
-        my_cards = identify_cards(
-            frame, region_to_pixels("my_cards", window_rect), scale
-        )
+        with TIMERS.stage("identify_hand"):
+            my_cards = identify_cards(
+                frame, region_to_pixels("my_cards", window_rect), scale
+            )
         logger.info(f"识别到自己的牌: {my_cards}")
-        for card, count in my_cards.items():
-            counter.mark(card, Player.MIDDLE, count)
+        counter.mark_play(Player.MIDDLE, counts_to_array(my_cards))
         counter.total_played[Player.MIDDLE] = 0  # 手牌标记不算出牌，重置为 0
+        counter.publish()
 
         expected = 20 if landlord == Player.MIDDLE else 17
         if sum(my_cards.values()) != expected:
@@ -263,76 +592,95 @@ def run(
         # ── 游戏主循环（帧间对比）────────────────────────────────────────
         # 每帧同时扫描三个出牌区域，与上一帧对比：
         # 某区域从空变为非空，或内容发生变化，则认为该玩家刚出了牌
-        prev: dict[Player, CardCounts] = {p: {} for p in PLAYERS}
-        # 上一帧各区域的原始像素裁剪图，用于跳过未变化区域的模板识别
-        prev_crops: dict[Player, GrayImage] = {}
-        prev_end_crop: Optional[GrayImage] = None
-        prev_end_cards: CardCounts = {}
+        # 各玩家出牌区上一帧的识别结果（按 CARDS 顺序的数组，直接整体比较）
+        prev: dict[Player, np.ndarray] = {p: np.zeros(len(CARDS), dtype=np.int32) for p in PLAYERS}
+        # 每帧需要识别的区域：三个出牌区 + 底牌区
+        watched = [*PLAY_REGIONS.values(), "three_displayed_cards"]
+        # 各区域自上次识别以来是否变化的判断（exact / signature，见 config.yaml 的 RECOGNITION.CHANGE_GATE）；
+        # 内容完全相同的区域（包括不同区域、不同帧之间）由 RESULT_CACHE 在 identify_cards 内部复用结果
+        gate = ChangeGate()
+        # 各区域最近一次的识别结果，区域像素未变时直接复用
+        recognized: dict[str, CardCounts] = {}
         last_player = Player.LEFT  # 记录最后出牌的玩家，游戏结束校验时使用
+        request_regions(*watched)
+        if scheduler is not None:
+            scheduler.playing()
 
-        for frame, window_rect in frames:  # type: GrayImage, tuple[int,int,int,int]
+        for frame, window_rect, frame_time in frames:  # type: GrayImage, tuple[int,int,int,int], float
             if stop_event.is_set():
                 return
 
+            # 变化检测：区域与上次识别时相比没有变化，直接复用上次识别结果，跳过模板匹配；
+            # 其余发生变化的区域合在一起批量识别
+            with TIMERS.stage("region_to_pixels"):
+                regions = {name: region_to_pixels(name, window_rect) for name in watched}
+            changed: dict[str, tuple[int, int, int, int]] = {}
+            with TIMERS.stage("change_gate"):
+                for name, region in regions.items():
+                    x1, y1, x2, y2 = region
+                    if gate.changed(name, frame[y1:y2, x1:x2]):
+                        changed[name] = region
+            TIMERS.count("regions_unchanged", len(watched) - len(changed))
+            TIMERS.count("regions_changed", len(changed))
+            with TIMERS.stage("identify_cards"):
+                recognized.update(identify_cards_batch(frame, changed, scale))
+            plays: dict[Player, CardCounts] = {p: recognized[PLAY_REGIONS[p]] for p in PLAYERS}
+            curr = {p: counts_to_array(plays[p]) for p in PLAYERS}
+            # 出牌区非空且与上一帧不同，说明该玩家刚打出了新的一手牌
+            new_play = {p: bool(curr[p].any()) and not np.array_equal(curr[p], prev[p]) for p in PLAYERS}
+
             # 检测游戏是否结束：底牌区域（三张翻开的牌）出现时说明有人出完牌了
-            end_region = region_to_pixels("three_displayed_cards", window_rect)
-            x1, y1, x2, y2 = end_region
-            end_crop: GrayImage = frame[y1:y2, x1:x2]
-            if prev_end_crop is not None and np.array_equal(end_crop, prev_end_crop):
-                end_cards = prev_end_cards
-                logger.debug("底牌区域像素未变，跳过识别")
-            else:
-                end_cards = identify_cards(frame, end_region, scale)
-                prev_end_crop = end_crop
-                prev_end_cards = end_cards
+            end_cards = recognized["three_displayed_cards"]
             if end_cards:
                 logger.info(f"游戏结束，底牌区域识别到: {end_cards}")
-                # 底牌与最后一手牌同帧出现，需在 break 前扫描出牌区确定赢家
+                # 底牌与最后一手牌同帧出现，需在 break 前检查出牌区确定赢家
+                final_play: Optional[Player] = None
                 for player in PLAYERS:
                     if player == Player.MIDDLE:
                         continue
-                    region = region_to_pixels(PLAY_REGIONS[player], window_rect)
-                    cards_this_frame = identify_cards(frame, region, scale)
-                    if cards_this_frame and cards_this_frame != prev.get(player, {}):
-                        logger.info(f"游戏结束帧检测到 {player.value} 出牌: {cards_this_frame}")
-                        for card, count in cards_this_frame.items():
-                            counter.mark(card, player, count, affect_remaining=(player != Player.MIDDLE))
+                    if new_play[player]:
+                        logger.info(f"游戏结束帧检测到 {player.value} 出牌: {plays[player]}")
+                        counter.mark_play(player, curr[player], affect_remaining=(player != Player.MIDDLE))
                         last_player = player
                         if on_update:
-                            on_update(player, cards_this_frame)
+                            with TIMERS.stage("on_update"):
+                                on_update(player, plays[player])
+                        final_play = player
                         break
+                with TIMERS.stage("publish"):
+                    counter.publish()
+                if final_play is not None:
+                    _report_timing(PlayTiming(final_play, plays[final_play], frame_time, clock()), on_timing)
                 assert landlord is not None
                 verify_counts(counter, landlord, last_player)
+                logger.debug(RESULT_CACHE.summary())
                 break
 
-            # 同时扫描三个出牌区域
-            # 像素级变化检测：若裁剪图与上一帧完全相同，直接复用上次识别结果，跳过模板匹配
-            curr: dict[Player, CardCounts] = {}
-            for player in PLAYERS:
-                region = region_to_pixels(PLAY_REGIONS[player], window_rect)
-                x1, y1, x2, y2 = region
-                crop: GrayImage = frame[y1:y2, x1:x2]
-                if player in prev_crops and np.array_equal(crop, prev_crops[player]):
-                    curr[player] = prev[player]  # 像素未变，复用上次结果
-                    logger.debug(f"{player.value} 出牌区像素未变，跳过识别")
-                else:
-                    curr[player] = identify_cards(frame, region, scale)
-                    prev_crops[player] = crop
-
             # 对比变化，记录出牌
             for player in PLAYERS:
-                # curr 非空且与上一帧不同，说明该玩家刚打出了新的一手牌
                 # 直接记录 curr 里的全部张数（curr != prev 已保证不会对同一手牌重复计数）
                 # 自己（MIDDLE）的牌已在初始化时从 remaining 整体扣除，出牌不再影响 remaining
-                if curr[player] and curr[player] != prev[player]:
-                    logger.info(f"{player.value} 出牌: {curr[player]}")
-                    for card, count in curr[player].items():
-                        counter.mark(card, player, count, affect_remaining=(player != Player.MIDDLE))
+                if new_play[player]:
+                    logger.info(f"{player.value} 出牌: {plays[player]}")
+                    counter.mark_play(player, curr[player], affect_remaining=(player != Player.MIDDLE))
                     last_player = player
                     if on_update:
-                        on_update(player, curr[player])
+                        with TIMERS.stage("on_update"):
+                            on_update(player, plays[player])
+            # 同一帧内的所有计数变化（如炸弹、长顺子的每一张牌）合成一批交给 UI
+            with TIMERS.stage("publish"):
+                counter.publish()
+            if any(new_play.values()):
+                counted_at = clock()
+                for player in PLAYERS:
+                    if new_play[player]:
+                        _report_timing(PlayTiming(player, plays[player], frame_time, counted_at), on_timing)
 
+            if scheduler is not None:
+                # 有人刚出牌（或刚清空出牌区）说明轮次在推进，下一家很快就会出牌
+                scheduler.report(any(not np.array_equal(curr[p], prev[p]) for p in PLAYERS))
             prev = curr
+            TIMERS.maybe_report()
 
 
 # ---------------------------------------------------------------------------
@@ -341,7 +689,9 @@ def run(
 
 
 class Tracker:
-    """封装后端线程的启动/停止，供 UI 调用。"""
+    """封装后端线程的启动/停止，供 UI 调用。
+    各回调都在后端线程中调用，涉及 tkinter 的回调需要由调用方转到主线程执行（见 MasterWindow._from_backend）。
+    """
 
     def __init__(
         self,
@@ -367,12 +717,37 @@ class Tracker:
         # 避免两次调用之间窗口移动导致截图区域与坐标不一致
         self._stop_event.clear()
         window_rect = find_game_window()
-        frames = live_frames(window_rect, self._stop_event)
+        roi_only = CAPTURE.get("ROI_ONLY", False)
+        recorder = SessionRecorder.from_config() if RECORDING.get("ENABLED", False) else None
+        # 录制时即使截取整个窗口，也需要 run() 声明的区域来决定录下哪些区域
+        plan = RegionPlan() if roi_only or recorder is not None else None
+        capture_plan = plan if roi_only else None
+        scheduler = FrameScheduler()
+        frames = live_frames(window_rect, self._stop_event, scheduler, capture_plan)
+        if CAPTURE.get("PIPELINE", False):
+            # 截图在独立线程中进行，识别慢的帧不再推迟下一次截图
+            frames = iter(
+                FramePipeline(
+                    frames,
+                    self._stop_event,
+                    capture_plan,
+                    CAPTURE.get("QUEUE_SIZE", 2),
+                    CAPTURE.get("QUEUE_POLICY", "drop_oldest"),
+                )
+            )
+        if recorder is not None:
+            assert plan is not None
+            frames = recorder.wrap(frames, plan)
+
         def _run_safe(*args, **kwargs):
             try:
                 run(*args, **kwargs)
             except Exception as e:
                 logger.exception(f"后端线程异常退出: {e}")
+            finally:
+                if recorder is not None:
+                    recorder.close()
+                shutdown_parallel()
 
         self._thread = Thread(
             target=_run_safe,
@@ -383,6 +758,8 @@ class Tracker:
                 self.on_update,
                 self.mark_potential_bombs,
                 self.on_reset,
+                plan,
+                scheduler,
             ),
             daemon=True,  # 主线程退出时后端线程自动结束，不会阻止程序退出
         )
@@ -19,6 +19,7 @@ from loguru import logger
 import config as _config
 from config import GUI, HOTKEYS
 from card_types import Card, WindowsType
+from profiling import TIMERS
 
 
 # ---------------------------------------------------------------------------
@@ -154,14 +155,15 @@ class CounterWindow(tk.Toplevel):
         self._card_labels: dict[Card, tk.Label] = {}
         self._count_labels: dict[Card, tk.Label] = {}
 
-        # 根据窗口类型决定数量标签绑定哪个计数器变量
-        # textvariable 让标签内容自动跟随 IntVar 变化，无需手动刷新
+        # 根据窗口类型决定数量标签显示哪张计数表，之后由 update_counts 只刷新变化的标签
         if is_main:
-            get_var = lambda card: self._counter.remaining[card]
+            self._table = "remaining"
         elif self._window_type == WindowsType.LEFT:
-            get_var = lambda card: self._counter.left[card]
+            self._table = "left"
         else:
-            get_var = lambda card: self._counter.right[card]
+            self._table = "right"
+        counts = getattr(self._counter, self._table)  # 按 Card 顺序排列的数组
+        self._shown: dict[Card, int] = {card: int(counts[i]) for i, card in enumerate(Card)}
 
         for idx, card in enumerate(Card):
             name_text = card.value if card != Card.JOKER else "王"
@@ -169,7 +171,7 @@ class CounterWindow(tk.Toplevel):
                 text=name_text, font=("Arial", font_size), bg="lightblue", fg="black"
             )
             count_lbl = make_label(
-                textvariable=get_var(card),
+                text=str(self._shown[card]),
                 font=("Arial", font_size, "bold"),
                 bg="lightyellow",
                 fg="black",
@@ -205,6 +207,15 @@ class CounterWindow(tk.Toplevel):
         for j in range(cols):
             frame.grid_columnconfigure(j, weight=1)
 
+    # ── 数量更新（由主窗口在主线程中调用）──────────────────────────────────
+
+    def update_counts(self, update: dict[tuple[str, Card], int]) -> None:
+        """应用一批计数变化（见 tracker.Counter.publish），只改动本窗口中数值确实变化的标签。"""
+        for (table, card), value in update.items():
+            if table == self._table and self._shown[card] != value:
+                self._shown[card] = value
+                self._count_labels[card].config(text=str(value))
+
     # ── 颜色更新（供 tracker 回调调用）────────────────────────────────────
 
     def set_card_color(self, card: Card, color: str) -> None:
@@ -229,6 +240,7 @@ class CounterWindow(tk.Toplevel):
             "OPEN_CONFIG": lambda e: open_config(),
             "RESET": lambda e: self._reset(),
             "TOGGLE_OVERLAY": lambda e: self._parent._overlay.toggle(),
+            "DUMP_TIMINGS": lambda e: TIMERS.report(),
         }
         for key, callback in hotkey_map.items():
             if key in HOTKEYS:
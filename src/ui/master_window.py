@@ -5,6 +5,8 @@
 import sys
 import tkinter as tk
 from pathlib import Path
+from queue import Empty, SimpleQueue
+from typing import Callable
 
 from loguru import logger
 from ruamel.yaml import YAML
@@ -22,12 +24,14 @@ class MasterWindow(tk.Tk):
 
     def __init__(self) -> None:
         super().__init__()
-        self._counter = Counter()
+        self._counter = Counter(publish_updates=True)
+        # 后端线程的回调不能直接操作 tkinter，先放进队列，由 _drain_updates 在主线程中执行
+        self._ui_events: SimpleQueue[tuple[Callable, tuple]] = SimpleQueue()
         self._tracker = Tracker(
             self._counter,
-            on_update=self._on_card_played,
-            mark_potential_bombs=self._mark_potential_bombs,
-            on_reset=self._on_reset,
+            on_update=self._from_backend(self._on_card_played),
+            mark_potential_bombs=self._from_backend(self._mark_potential_bombs),
+            on_reset=self._from_backend(self._on_reset),
         )
         self._windows: list[CounterWindow] = []
 
@@ -96,6 +100,7 @@ class MasterWindow(tk.Tk):
         self.bind("<B1-Motion>", self._on_drag_move)
         self.bind("<ButtonRelease-1>", self._on_drag_end)
 
+        self.after(self._UI_TICK_MS, self._drain_updates)  # type: ignore
         logger.success("主控窗口初始化完毕")
 
     # ── 开关 ────────────────────────────────────────────────────────────────
@@ -157,6 +162,42 @@ class MasterWindow(tk.Tk):
         else:
             self._enable_switch()
 
+    # ── 后端更新（在主线程中统一应用）──────────────────────────────────────
+
+    _UI_TICK_MS = 50  # 主线程取出后端更新的间隔（毫秒）
+
+    def _from_backend(self, callback: Callable) -> Callable:
+        """包装供后端线程调用的回调：调用时只把回调和参数放进队列，真正执行在主线程中进行。"""
+        return lambda *args: self._ui_events.put((callback, args))
+
+    def _drain_updates(self) -> None:
+        """定时取出后端线程发布的计数变化和回调。
+        两次之间积累的计数变化合并成一批，每个标签最多刷新一次。
+        """
+        try:
+            merged: dict = {}
+            while True:
+                try:
+                    merged.update(self._counter.updates.get_nowait())
+                except Empty:
+                    break
+            while True:
+                try:
+                    callback, args = self._ui_events.get_nowait()
+                except Empty:
+                    break
+                try:
+                    callback(*args)
+                except Exception:
+                    # 单个回调出错不影响后续回调和计数刷新
+                    logger.exception(f"界面回调 {getattr(callback, '__name__', callback)} 执行失败")
+            if merged:
+                for win in self._windows:
+                    win.update_counts(merged)
+        finally:
+            # 无论本轮是否出错都继续定时取更新，否则界面会停止刷新
+            self.after(self._UI_TICK_MS, self._drain_updates)  # type: ignore
+
     # ── 出牌回调（更新窗口颜色）────────────────────────────────────────────
 
     def _on_reset(self) -> None:
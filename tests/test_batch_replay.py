@@ -0,0 +1,64 @@
+"""
+batch_replay 按对局切分长录屏的回归测试：对局之间几乎没有空白画面时，稀疏扫描也不能丢掉任何一局。
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from batch_replay import find_game_segments, merge_segments, replay_file
+from synthetic import SyntheticGame, random_game
+
+_FPS = 2.0
+_GAMES = 3
+
+
+@pytest.fixture(scope="module")
+def back_to_back(tmp_path_factory: pytest.TempPathFactory) -> tuple[str, SyntheticGame]:
+    """连续 3 局的合成录屏：每局之前只有 2–4 帧空白画面，比扫描间隔（2 秒 = 4 帧）还短。"""
+    rng = np.random.default_rng(0)
+    game = SyntheticGame(seed=0)
+    for _ in range(_GAMES):
+        random_game(game, rng)
+    path = tmp_path_factory.mktemp("recordings") / "back_to_back.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter.fourcc(*"mp4v"), _FPS, (game.width, game.height))
+    for gray, _, _ in game.frames(_FPS):
+        writer.write(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    writer.release()
+    return str(path), game
+
+
+def _landlord_frames(game: SyntheticGame) -> list[int]:
+    """画面上有地主标记（对局进行中或结束画面）的帧号。"""
+    frames: list[int] = []
+    i = 0
+    for scene in game._scenes:
+        if scene.landlord is not None:
+            frames.extend(range(i, i + scene.frames))
+        i += scene.frames
+    return frames
+
+
+@pytest.mark.parametrize("scan_interval", [1.0, 2.0, 3.0])
+def test_segments_cover_every_game(back_to_back: tuple[str, SyntheticGame], scan_interval: float) -> None:
+    path, game = back_to_back
+    segments = find_game_segments(path, scan_interval)
+    assert all(end <= start for (_, end), (start, _) in zip(segments, segments[1:]))  # 按时间排列、互不重叠
+    uncovered = [f for f in _landlord_frames(game) if not any(start <= f < end for start, end in segments)]
+    assert uncovered == []
+
+
+def test_split_replay_finds_every_game(back_to_back: tuple[str, SyntheticGame]) -> None:
+    path, game = back_to_back
+    segments = find_game_segments(path, 2.0)
+    merged = merge_segments(path, segments, [replay_file(path, 0.0, start, end) for start, end in segments])
+    assert merged["error"] is None
+    assert [g["finished"] for g in merged["games"]] == [True] * _GAMES
+    plays = [(p["player"], p["cards"]) for g in merged["games"] for p in g["plays"]]
+    assert plays == [(player.name, {c.value: n for c, n in cards.items()}) for player, cards in game.expected]
+
+
+def test_unsplit_reference(back_to_back: tuple[str, SyntheticGame]) -> None:
+    """不切分的完整回放作为对照：同一段录屏应识别出同样多的对局。"""
+    path, _ = back_to_back
+    assert len(replay_file(path)["games"]) == _GAMES
@@ -0,0 +1,80 @@
+"""
+identify_cards 用真实的牌模板识别合成出牌区时，nms_peaks 与原来的 np.where + nms_matches 计数方式结果一致。
+覆盖多种缩放比例，以及模糊、字形互相压住的摆放方式；nms_peaks 的两条路径（候选点少时的逐点贪心、
+腐蚀/膨胀）都要与原来的方式一致。
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+import recognize
+from card_types import Card
+from recognize import TEMPLATE_BANK, ResultCache, identify_cards, nms_matches
+from synthetic import _paste_cards
+
+_SCALES = [0.6, 0.8, 1.0, 1.5, 2.0]
+_LAYOUTS = ["spread", "overlapping", "blurred"]
+
+
+@pytest.fixture(params=["list", "morphology"], autouse=True)
+def nms_path(request, monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setattr(recognize, "_NMS_LIST_MAX", 10**9 if request.param == "list" else 0)
+    # 缓存键不区分 NMS 路径，两条路径必须各自真正识别一次
+    monkeypatch.setattr(recognize, "RESULT_CACHE", ResultCache(0))
+    monkeypatch.setitem(recognize.RECOGNITION, "ENGINE", "template")
+    monkeypatch.setitem(recognize.RECOGNITION, "PYRAMID_LEVELS", 0)
+    return request.param
+
+
+def _where_counts(crop: np.ndarray, scale: float) -> dict[Card, int]:
+    """原来的计数方式：np.where 取出所有超过阈值的点，交给 nms_matches 逐点去重。"""
+    threshold = recognize.THRESHOLDS["card"]
+    results: dict[Card, int] = {}
+    for card, t in TEMPLATE_BANK.cards(scale).items():
+        if t.shape[0] > crop.shape[0] or t.shape[1] > crop.shape[1]:
+            continue
+        res = cv2.matchTemplate(crop, t, cv2.TM_CCOEFF_NORMED)
+        locs = np.where(res >= threshold)
+        raw_matches = [(float(res[y, x]), (x, y)) for x, y in zip(*locs[::-1])]
+        kept = nms_matches(raw_matches, max(t.shape[1] // 2, 5))
+        if kept:
+            results[card] = len(kept)
+    return results
+
+
+def _render(cards: list[Card], scale: float, layout: str) -> np.ndarray:
+    """把 cards 从左到右摆成一排出牌区，返回只包含这一排牌的裁剪图。"""
+    glyph_w = max(t.shape[1] for t in TEMPLATE_BANK.cards(scale).values())
+    # overlapping：后一张牌压住前一张字形的右侧两成，有的牌仍能认出、有的认不出
+    step = round(glyph_w * 0.8) if layout == "overlapping" else round(45 * scale)
+    width = step * len(cards) + round(110 * scale)
+    height = round(140 * scale)
+    crop = np.full((height, width), 60, dtype=np.uint8)
+    _paste_cards(crop, (0, 0, width, height), cards, scale, step, clip_to_region=False)
+    if layout == "blurred":
+        # 录屏缩放和压缩带来的模糊：高分点连成一片，热力图上出现平台和并列的峰
+        crop = cv2.GaussianBlur(crop, (0, 0), 1.2 * scale)
+    return crop
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("layout", _LAYOUTS)
+@pytest.mark.parametrize("scale", _SCALES)
+def test_matches_where_path(seed: int, layout: str, scale: float) -> None:
+    rng = np.random.default_rng(seed)
+    deck = list(Card)
+    # 固定加入一组炸弹，保证同一模板在一排里出现多次
+    cards = [deck[i] for i in rng.integers(0, len(deck), 8)] + [deck[seed]] * 4
+    crop = _render(cards, scale, layout)
+    assert identify_cards(crop, (0, 0, crop.shape[1], crop.shape[0]), scale) == _where_counts(crop, scale)
+
+
+@pytest.mark.parametrize("scale", _SCALES)
+def test_spread_counts(scale: float) -> None:
+    """字形互不遮挡时，两种方式都应数出摆上去的每一张牌。"""
+    cards = list(Card) + [Card.A] * 3
+    crop = _render(cards, scale, "spread")
+    expected = {card: cards.count(card) for card in set(cards)}
+    assert identify_cards(crop, (0, 0, crop.shape[1], crop.shape[0]), scale) == expected
+    assert _where_counts(crop, scale) == expected
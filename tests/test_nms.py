@@ -0,0 +1,91 @@
+"""
+nms_peaks（热力图上的腐蚀/膨胀 NMS）与 nms_matches（逐点比较的贪心 NMS）的一致性测试。
+nms_peaks 在候选点少时直接调用 nms_matches，用 _NMS_LIST_MAX 分别强制走两条路径。
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+import recognize
+from recognize import nms_matches, nms_peaks
+
+_SHAPES = [(1, 1), (1, 40), (37, 1), (30, 45), (24, 120)]
+_MIN_DISTS = [1, 2, 5, 12]
+
+
+@pytest.fixture(params=["list", "morphology"], autouse=True)
+def nms_path(request, monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setattr(recognize, "_NMS_LIST_MAX", 10**9 if request.param == "list" else 0)
+    return request.param
+
+
+def _greedy(res: np.ndarray, threshold: float, min_dist: int) -> list[tuple[float, tuple[int, int]]]:
+    """把热力图上的候选点按行优先顺序交给 nms_matches，与识别流程取候选点的方式一致。"""
+    ys, xs = np.nonzero(res >= threshold)
+    return nms_matches([(float(res[y, x]), (int(x), int(y))) for y, x in zip(ys, xs)], min_dist)
+
+
+def _check(res: np.ndarray, threshold: float, min_dist: int) -> None:
+    assert nms_peaks(res, threshold, min_dist) == _greedy(res, threshold, min_dist)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("shape", _SHAPES)
+@pytest.mark.parametrize("min_dist", _MIN_DISTS)
+def test_random_maps(seed: int, shape: tuple[int, int], min_dist: int) -> None:
+    rng = np.random.default_rng(seed)
+    res = rng.uniform(-1.0, 1.0, shape).astype(np.float32)
+    for threshold in (0.3, 0.8):
+        _check(res, threshold, min_dist)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("min_dist", _MIN_DISTS)
+def test_blurred_maps(seed: int, min_dist: int) -> None:
+    """模糊画面的热力图：高分点成片出现，同一片里要只留下一个。"""
+    rng = np.random.default_rng(seed)
+    res = cv2.GaussianBlur(rng.uniform(0.0, 1.0, (40, 120)).astype(np.float32), (0, 0), 3)
+    res = (res - res.min()) / (res.max() - res.min())
+    for threshold in (0.5, 0.7):
+        _check(res, threshold, min_dist)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("shape", _SHAPES)
+@pytest.mark.parametrize("min_dist", _MIN_DISTS)
+def test_ties(seed: int, shape: tuple[int, int], min_dist: int) -> None:
+    """只有几档分数的热力图，大量同分点：同分时先出现（行优先）的点优先。"""
+    rng = np.random.default_rng(seed)
+    res = (rng.integers(0, 5, shape) / 4).astype(np.float32)
+    _check(res, 0.5, min_dist)
+
+
+@pytest.mark.parametrize("min_dist", _MIN_DISTS)
+def test_plateaus(min_dist: int) -> None:
+    res = np.zeros((40, 60), dtype=np.float32)
+    res[5:15, 5:30] = 0.9
+    res[10:30, 20:40] = 0.9  # 与上一块重叠、同分
+    res[25:40, 45:60] = 0.95
+    _check(res, 0.8, min_dist)
+    _check(np.full((20, 30), 0.9, dtype=np.float32), 0.8, min_dist)
+
+
+@pytest.mark.parametrize("min_dist", _MIN_DISTS)
+def test_border_peaks(min_dist: int) -> None:
+    """峰值贴着热力图的四角和四边，以及离边界不到 min_dist 的峰。"""
+    h, w = 30, 50
+    res = np.zeros((h, w), dtype=np.float32)
+    for y, x, conf in [
+        (0, 0, 0.90), (0, w - 1, 0.91), (h - 1, 0, 0.92), (h - 1, w - 1, 0.93),
+        (0, w // 2, 0.94), (h // 2, 0, 0.95), (h - 1, w // 2, 0.96), (h // 2, w - 1, 0.97),
+        (1, 1, 0.99), (h - 2, w - 3, 0.98), (2, w - 2, 0.85),
+    ]:
+        res[y, x] = conf
+    _check(res, 0.8, min_dist)
+
+
+def test_no_candidates() -> None:
+    res = np.zeros((10, 10), dtype=np.float32)
+    assert nms_peaks(res, 0.5, 3) == []
+    assert nms_matches([], 3) == []
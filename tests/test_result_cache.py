@@ -0,0 +1,77 @@
+"""
+ResultCache.save / load 的文件格式：JSON 往返后键和值不变，不是缓存文件的输入被拒绝，格式不对的记录被跳过。
+"""
+
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from card_types import Card, Mark
+from recognize import ResultCache
+
+
+def _filled() -> ResultCache:
+    cache = ResultCache()
+    crop = np.arange(60, dtype=np.uint8).reshape(6, 10)
+    cache.put(ResultCache.key("cards", crop, 1.0, 0.8, "template", 0), {Card.A: 2, Card.JOKER: 1})
+    cache.put(ResultCache.key("cards", crop[:3], 1.25, 0.8, "segment", 1), {})
+    cache.put(ResultCache.key("mark", crop, Mark.LANDLORD.value, 1.0, 0), 0.93)
+    return cache
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    cache = _filled()
+    path = tmp_path / "cache.json"
+    cache.save(path)
+    loaded = ResultCache()
+    loaded.load(path)
+    assert list(loaded._entries.items()) == list(cache._entries.items())
+
+
+def test_missing_file_is_ignored(tmp_path: Path) -> None:
+    cache = ResultCache()
+    cache.load(tmp_path / "missing.json")
+    assert not cache._entries
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        pickle.dumps([("cards", {})]),
+        b"not json",
+        json.dumps([1, 2]).encode(),
+        json.dumps({"version": 0, "entries": []}).encode(),
+        json.dumps({"version": 1, "entries": {}}).encode(),
+    ],
+)
+def test_rejects_other_files(tmp_path: Path, content: bytes) -> None:
+    path = tmp_path / "cache.json"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        ResultCache().load(path)
+
+
+def test_skips_malformed_entries(tmp_path: Path) -> None:
+    path = tmp_path / "cache.json"
+    _filled().save(path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    good = len(data["entries"])
+    template = data["entries"][0]
+    data["entries"] += [
+        "entry",
+        {**template, "kind": "other"},
+        {**template, "digest": "zz" * 16},
+        {**template, "digest": "00"},
+        {**template, "shape": [6, -1]},
+        {**template, "params": [[1]]},
+        {**template, "value": {"X": 1}},
+        {**template, "value": {"A": "2"}},
+        {**template, "kind": "mark", "value": "0.9"},
+    ]
+    path.write_text(json.dumps(data), encoding="utf-8")
+    cache = ResultCache()
+    cache.load(path)
+    assert len(cache._entries) == good